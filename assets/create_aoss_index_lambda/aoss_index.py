@@ -0,0 +1,218 @@
+import os
+import time
+import json
+import random
+
+import boto3
+import requests
+from requests.adapters import HTTPAdapter
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+
+AWS_REGION = os.environ["AWS_REGION"]
+COLLECT_ENDPOINT = os.environ["COLLECTION_ENDPOINT"]
+
+# Exponential backoff with full jitter between the attempts
+INITIAL_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 15
+
+# Time kept aside to report the failure before the lambda times out
+DEADLINE_MARGIN_MILLIS = 5000
+REQUEST_TIMEOUT_SECONDS = 10
+
+# The data access policy takes a while to apply to a new collection,
+# until then the requests are denied or the index is not found.
+RETRYABLE_STATUS_CODES = {403, 404, 408, 429}
+
+service = "aoss"
+
+# Reused by all requests, the connections to the collection are kept alive
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+signer = SigV4Auth(boto3.Session().get_credentials(), service, AWS_REGION)
+
+
+class PermanentIndexError(Exception):
+    """
+    The request was rejected and retrying it would not help, e.g. an invalid mapping.
+    """
+
+
+class IndexNotReady(Exception):
+    """
+    The request failed for a reason that may go away when retried.
+    """
+
+
+def hnsw_method(engine, space_type, m, ef_construction, ef_search, compression):
+    parameters = {"m": m, "ef_construction": ef_construction}
+
+    # Lucene takes the number of candidates from the k of each query
+    if engine == "faiss":
+        parameters["ef_search"] = ef_search
+
+    # Scalar quantization, the embeddings are still given as floats
+    if compression == "fp16":
+        parameters["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+    elif compression == "byte":
+        parameters["encoder"] = {"name": "sq"}
+
+    return {
+        "name": "hnsw",
+        "engine": engine,
+        "space_type": space_type,
+        "parameters": parameters,
+    }
+
+
+def index_payload(dimension, metadata_field, text_field, vector_field, method):
+    return {
+        "settings": {"index": {"knn": "true"}},
+        "mappings": {
+            "properties": {
+                vector_field: {
+                    "type": "knn_vector",
+                    "dimension": dimension,
+                    "method": method,
+                },
+                metadata_field: {"type": "text"},
+                text_field: {"type": "text"},
+            }
+        },
+    }
+
+
+def signed_request(method, path, payload=None, data=None, allow_not_found=False):
+    """
+    Sends a SigV4 signed request to the collection, payload is sent
+    as JSON and data as it is, e.g. the NDJSON of a bulk request.
+    Not found is retried, unless the caller expects it.
+    """
+    if payload is not None:
+        data = json.dumps(payload)
+    req = AWSRequest(
+        method=method,
+        url=COLLECT_ENDPOINT + path,
+        data=data,
+        headers={
+            "content-type": (
+                "application/x-ndjson"
+                if path.endswith("/_bulk")
+                else "application/json"
+            ),
+            "accept": "application/json",
+        },
+    )
+    req.headers["X-Amz-Content-SHA256"] = signer.payload(req)
+    signer.add_auth(req)
+    req = req.prepare()
+
+    try:
+        response = http_session.request(
+            method=req.method,
+            url=req.url,
+            headers=req.headers,
+            data=req.body,
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+    except requests.RequestException as e:
+        raise IndexNotReady(f"{method} {path} failed: {e}") from e
+
+    if allow_not_found and response.status_code == 404:
+        return response
+
+    if response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500:
+        raise IndexNotReady(
+            f"{method} {path} - status: {response.status_code}. Reason: {response.text}"
+        )
+
+    return response
+
+
+def with_backoff(context, description, operation):
+    """
+    Calls the operation until it succeeds, stops when the next attempt
+    would not complete before the lambda times out.
+    """
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except IndexNotReady as e:
+            delay = random.uniform(
+                0, min(MAX_BACKOFF_SECONDS, INITIAL_BACKOFF_SECONDS * 2**attempt)
+            )
+            remaining_millis = context.get_remaining_time_in_millis()
+            if (
+                remaining_millis
+                - (delay + REQUEST_TIMEOUT_SECONDS) * 1000
+                - DEADLINE_MARGIN_MILLIS
+                < 0
+            ):
+                raise TimeoutError(
+                    f"Gave up to {description} after {attempt + 1} attempts: {e}"
+                ) from e
+
+            print(f"Retrying to {description} in {delay:.1f} s: {e}")
+            time.sleep(delay)
+            attempt += 1
+
+
+def create_index(index_name, payload):
+    response = signed_request("PUT", f"/{index_name}", payload)
+
+    if response.status_code == 200:
+        print(f"Index create successfully: {response.text}")
+        return
+
+    # Created by an earlier attempt whose response was lost
+    if "resource_already_exists_exception" in response.text:
+        print(f"Index already exists: {response.text}")
+        return
+
+    raise PermanentIndexError(
+        f"Failed to create index - status: {response.status_code}. Reason: {response.text}"
+    )
+
+
+def check_index_ready(index_name, vector_field):
+    """
+    The knowledge base fails to validate its storage configuration until the
+    mapping of the new index is visible and the index can be searched.
+    """
+    response = signed_request("GET", f"/{index_name}/_mapping")
+    if response.status_code != 200:
+        raise PermanentIndexError(
+            f"Failed to read the index mapping - status: {response.status_code}. "
+            f"Reason: {response.text}"
+        )
+
+    properties = (
+        response.json().get(index_name, {}).get("mappings", {}).get("properties", {})
+    )
+    if vector_field not in properties:
+        raise IndexNotReady(f"The mapping of {vector_field} is not visible yet")
+
+    response = signed_request(
+        "POST",
+        f"/{index_name}/_search",
+        {"size": 0, "query": {"match_all": {}}},
+    )
+    if response.status_code != 200:
+        raise IndexNotReady(
+            f"The index cannot be searched yet - status: {response.status_code}"
+        )
+
+    print(f"Index {index_name} is ready")
+
+
+def delete_index(index_name):
+    response = signed_request("DELETE", f"/{index_name}", allow_not_found=True)
+
+    if response.status_code not in (200, 404):
+        raise PermanentIndexError(
+            f"Failed to delete index - status: {response.status_code}. Reason: {response.text}"
+        )
+
+    print(f"Index {index_name} deleted: {response.text}")
@@ -0,0 +1,311 @@
+import json
+import hashlib
+
+from aoss_index import (
+    PermanentIndexError,
+    IndexNotReady,
+    hnsw_method,
+    index_payload,
+    signed_request,
+    with_backoff,
+    create_index,
+    check_index_ready,
+    delete_index,
+)
+
+# Documents copied per search and bulk request
+COPY_PAGE_SIZE = 500
+
+# Resource properties that are part of the index definition
+INDEX_DEFINITION_PROPERTIES = [
+    "Dimension",
+    "MetadataField",
+    "TextField",
+    "VectorField",
+    "Engine",
+    "SpaceType",
+    "M",
+    "EfConstruction",
+    "EfSearch",
+    "Compression",
+]
+
+# Properties the ingested documents depend on. The documents cannot be copied
+# to an index that changes them, they would have to be ingested again.
+DOCUMENT_PROPERTIES = ["Dimension", "MetadataField", "TextField", "VectorField"]
+
+
+def _versioned_index_name(properties):
+    """
+    The name of the index is derived from its definition, so that the same
+    definition always maps to the same index and a change to a new one.
+    """
+    definition = json.dumps(
+        {name: properties[name] for name in INDEX_DEFINITION_PROPERTIES},
+        sort_keys=True,
+    )
+    version = hashlib.sha256(definition.encode("utf-8")).hexdigest()[:8]
+
+    return f"{properties['IndexNamePrefix']}-{version}"
+
+
+def _index_payload(properties):
+    return index_payload(
+        int(properties["Dimension"]),
+        properties["MetadataField"],
+        properties["TextField"],
+        properties["VectorField"],
+        hnsw_method(
+            properties["Engine"],
+            properties["SpaceType"],
+            int(properties["M"]),
+            int(properties["EfConstruction"]),
+            int(properties["EfSearch"]),
+            properties["Compression"],
+        ),
+    )
+
+
+def _count_documents(index_name):
+    """
+    Returns the number of documents, None if the index does not exist.
+    """
+    response = signed_request("GET", f"/{index_name}/_count", allow_not_found=True)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise PermanentIndexError(
+            f"Failed to count the documents of {index_name} - "
+            f"status: {response.status_code}. Reason: {response.text}"
+        )
+
+    return response.json()["count"]
+
+
+def _alias_indexes(alias_name):
+    response = signed_request("GET", f"/_alias/{alias_name}", allow_not_found=True)
+    if response.status_code == 404:
+        return []
+    if response.status_code != 200:
+        raise PermanentIndexError(
+            f"Failed to read the alias {alias_name} - status: {response.status_code}. "
+            f"Reason: {response.text}"
+        )
+
+    return list(response.json().keys())
+
+
+def _copy_page(source_index_name, target_index_name, search_after):
+    """
+    Copies the next page of documents in the order of their ids, returns the
+    number of copied documents and the sort values to continue after.
+    """
+    query = {
+        "size": COPY_PAGE_SIZE,
+        "query": {"match_all": {}},
+        # A unique sort key gives a stable order, pages neither overlap nor skip
+        "sort": [{"_id": "asc"}],
+    }
+    if search_after is not None:
+        query["search_after"] = search_after
+
+    response = signed_request("POST", f"/{source_index_name}/_search", query)
+    if response.status_code != 200:
+        raise IndexNotReady(
+            f"Failed to read the documents of {source_index_name} - "
+            f"status: {response.status_code}"
+        )
+
+    hits = response.json()["hits"]["hits"]
+    if not hits:
+        return 0, search_after
+
+    # The collection generates the ids of the documents, like for the ingestion
+    bulk_body = "".join(
+        json.dumps({"index": {"_index": target_index_name}})
+        + "\n"
+        + json.dumps(hit["_source"])
+        + "\n"
+        for hit in hits
+    )
+    response = signed_request("POST", "/_bulk", data=bulk_body)
+    if response.status_code != 200 or response.json().get("errors"):
+        raise PermanentIndexError(
+            f"Failed to write the documents to {target_index_name} - "
+            f"status: {response.status_code}. Reason: {response.text[:1000]}"
+        )
+
+    return len(hits), hits[-1]["sort"]
+
+
+def _copy_documents(context, source_index_name, target_index_name):
+    """
+    Copies the ingested documents with their embeddings to the new index,
+    the knowledge base would only ingest the documents changed since its last
+    ingestion job. Returns the number of documents of the new index.
+    """
+    source_count = with_backoff(
+        context, "count documents", lambda: _count_documents(source_index_name)
+    )
+    if not source_count:
+        print(f"No documents to copy from {source_index_name}")
+        return 0
+
+    # A retried update must not copy the documents twice
+    target_count = with_backoff(
+        context, "count documents", lambda: _count_documents(target_index_name)
+    )
+    if target_count:
+        print(f"{target_index_name} already has {target_count} documents")
+        return source_count
+
+    copied_count = 0
+    search_after = None
+    while True:
+        page_count, search_after = with_backoff(
+            context,
+            "copy documents",
+            lambda: _copy_page(source_index_name, target_index_name, search_after),
+        )
+        if not page_count:
+            break
+        copied_count += page_count
+        print(f"Copied {copied_count} of {source_count} documents")
+
+    return copied_count
+
+
+def _wait_for_documents(index_name, expected_count):
+    # New documents become searchable with a delay
+    count = _count_documents(index_name)
+    if count != expected_count:
+        raise IndexNotReady(
+            f"{index_name} has {count} of {expected_count} documents searchable"
+        )
+
+
+def _point_alias(alias_name, index_name):
+    """
+    Moves the alias to the index in a single atomic request, so that the
+    knowledge base always retrieves from exactly one index.
+    """
+    actions = [
+        {"remove": {"index": current_index_name, "alias": alias_name}}
+        for current_index_name in _alias_indexes(alias_name)
+        if current_index_name != index_name
+    ]
+    actions.append({"add": {"index": index_name, "alias": alias_name}})
+
+    response = signed_request("POST", "/_aliases", {"actions": actions})
+    if response.status_code != 200:
+        raise PermanentIndexError(
+            f"Failed to point the alias {alias_name} to {index_name} - "
+            f"status: {response.status_code}. Reason: {response.text}"
+        )
+
+    print(f"Alias {alias_name} points to {index_name}")
+
+
+def _wait_for_alias(alias_name, index_name):
+    if _alias_indexes(alias_name) != [index_name]:
+        raise IndexNotReady(f"Alias {alias_name} does not point to {index_name} yet")
+
+
+def _discard_version(context, alias_name, index_name, previous_index_name):
+    """
+    Deletes a new index that failed to replace the previous one, which the
+    knowledge base keeps retrieving from.
+    """
+    try:
+        if previous_index_name is not None and index_name in _alias_indexes(alias_name):
+            with_backoff(
+                context,
+                "point alias back",
+                lambda: _point_alias(alias_name, previous_index_name),
+            )
+        with_backoff(context, "delete index", lambda: delete_index(index_name))
+    except Exception as e:
+        print(f"Failed to delete the index {index_name}: {e}")
+
+
+def _create_version(context, properties, previous_index_name=None):
+    index_name = _versioned_index_name(properties)
+    alias_name = properties["AliasName"]
+    vector_field = properties["VectorField"]
+    payload = _index_payload(properties)
+
+    try:
+        with_backoff(context, "create index", lambda: create_index(index_name, payload))
+        with_backoff(
+            context,
+            "wait for the index",
+            lambda: check_index_ready(index_name, vector_field),
+        )
+
+        if previous_index_name is not None and previous_index_name != index_name:
+            document_count = _copy_documents(context, previous_index_name, index_name)
+            with_backoff(
+                context,
+                "wait for the documents",
+                lambda: _wait_for_documents(index_name, document_count),
+            )
+
+        with_backoff(
+            context, "point alias", lambda: _point_alias(alias_name, index_name)
+        )
+        with_backoff(
+            context,
+            "wait for the alias",
+            lambda: _wait_for_alias(alias_name, index_name),
+        )
+    except Exception:
+        # The new index is unknown to CloudFormation and would be left behind
+        if index_name != previous_index_name:
+            _discard_version(context, alias_name, index_name, previous_index_name)
+        raise
+
+    return {
+        "PhysicalResourceId": index_name,
+        "Data": {"IndexName": index_name, "AliasName": alias_name},
+    }
+
+
+def on_event(event, context):
+    """
+    Custom resource of the versioned vector index behind the alias of the
+    knowledge base. A changed definition creates a new index, the documents
+    are copied to it before the alias is moved. CloudFormation then deletes
+    the previous index, as its physical id has changed. Only the HNSW
+    parameters can change, the documents would not fit other fields.
+    """
+    print(json.dumps(event, indent=4))
+
+    request_type = event["RequestType"]
+    properties = event["ResourceProperties"]
+
+    if request_type == "Create":
+        return _create_version(context, properties)
+
+    if request_type == "Update":
+        previous_index_name = event["PhysicalResourceId"]
+
+        old_properties = event["OldResourceProperties"]
+        changed_properties = [
+            name
+            for name in DOCUMENT_PROPERTIES
+            if properties[name] != old_properties[name]
+        ]
+        if changed_properties:
+            raise PermanentIndexError(
+                f"{', '.join(changed_properties)} cannot be changed, the ingested "
+                "documents depend on them. Create a new knowledge base instead."
+            )
+
+        return _create_version(context, properties, previous_index_name)
+
+    # Failed creates are deleted with a physical id that is not an index
+    index_name = event["PhysicalResourceId"]
+    if index_name.startswith(f"{properties['IndexNamePrefix']}-"):
+        with_backoff(context, "delete index", lambda: delete_index(index_name))
+
+    return {"PhysicalResourceId": index_name}
@@ -1,69 +1,231 @@
 import os
+import time
+import random
 import boto3
 import json
-from boto3.dynamodb.conditions import Key
 
-RESERVATIONS_DYNAMODB_TABLE_NAME = os.environ["RESERVATIONS_DYNAMODB_TABLE_NAME"]
+from metadata_loader import S3MetadataLoader, read_restaurants_metadata
+from restaurant_index import RestaurantNameIndex, unknown_restaurant_message
+from reservation_slots import SlotSettings, InvalidSlot, parse_slot
+
+BOOKED_CAPACITY_DYNAMODB_TABLE_NAME = os.environ["BOOKED_CAPACITY_DYNAMODB_TABLE_NAME"]
 METADATA_S3_BUCKET = os.environ["METADATA_S3_BUCKET"]
 METADATA_S3_KEY = os.environ["METADATA_S3_KEY"]
+METADATA_REFRESH_SECONDS = int(os.environ.get("METADATA_REFRESH_SECONDS", "60"))
+
+# BatchGetItem accepts up to 100 keys, the agent should never need that many
+MAX_BULK_RESTAURANTS = 50
+BATCH_GET_MAX_ATTEMPTS = 5
 
-s3_resource = boto3.resource("s3")
-dynamo_resource = boto3.resource("dynamodb")
+dynamodb_client = boto3.client("dynamodb")
 
-reservations_table = dynamo_resource.Table(RESERVATIONS_DYNAMODB_TABLE_NAME)
+slot_settings = SlotSettings.from_environ()
 
 
 def _get_parameter(event, param_name):
     return next(p for p in event["parameters"] if p["name"] == param_name)["value"]
 
 
-def _load_metadata_json():
-    metadata_object = s3_resource.Object(METADATA_S3_BUCKET, METADATA_S3_KEY)
-    metadata_content = metadata_object.get()["Body"].read().decode("utf-8")
-    metadata_json = json.loads(metadata_content)
+def _build_restaurant_name_index(metadata_content):
+    metadata_json = read_restaurants_metadata(METADATA_S3_KEY, metadata_content)
 
-    return metadata_json
+    return RestaurantNameIndex(metadata_json)
 
 
-ALL_RESTAURANT_METADATA = _load_metadata_json()
+# Reloaded in a warm lambda only when the metadata in S3 changes
+restaurants_metadata = S3MetadataLoader(
+    METADATA_S3_BUCKET,
+    METADATA_S3_KEY,
+    build_index=_build_restaurant_name_index,
+    refresh_interval_seconds=METADATA_REFRESH_SECONDS,
+)
 
 
 def _get_metadata(restaurant_name):
-    return next(
-        m for m in ALL_RESTAURANT_METADATA if m["restaurant_name"] == restaurant_name
-    )
+    """
+    Returns the metadata of the restaurant, or None together with
+    the names of the most similar restaurants.
+    """
+    name_index = restaurants_metadata.get().index
+
+    restaurant_metadata = name_index.get(restaurant_name)
+    if restaurant_metadata is not None:
+        return restaurant_metadata, []
+
+    return None, name_index.suggest(restaurant_name)
+
+
+def _parse_restaurant_names(value):
+    """
+    The agent passes arrays as a string, usually as JSON
+    but sometimes as a plain comma separated list.
+    """
+    try:
+        names = json.loads(value)
+    except json.JSONDecodeError:
+        names = value.strip().strip("[]").split(",")
+
+    if isinstance(names, str):
+        names = [names]
+
+    names = [str(name).strip().strip("'\"").strip() for name in names]
+
+    # Keep the order of the agent but drop duplicates and empty names
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _get_booked_persons(restaurant_name, slot):
+    """
+    Reads the counter maintained by the reservations lambda, a slot without
+    a counter has no reservations. Drift of the counters is corrected by
+    scripts/reconcile_booked_capacity.py.
+    """
+    booked_capacity = dynamodb_client.get_item(
+        TableName=BOOKED_CAPACITY_DYNAMODB_TABLE_NAME,
+        Key={"restaurant_name": {"S": restaurant_name}, "slot": {"S": slot.key}},
+        ProjectionExpression="booked_persons",
+        ConsistentRead=True,
+    ).get("Item")
+
+    return int(booked_capacity["booked_persons"]["N"]) if booked_capacity else 0
+
+
+def _get_booked_persons_bulk(restaurant_names, slot):
+    """
+    Reads the counters of all restaurants with BatchGetItem,
+    the restaurants without a counter have no reservations.
+    """
+    booked_persons = {name: 0 for name in restaurant_names}
+    request_items = {
+        BOOKED_CAPACITY_DYNAMODB_TABLE_NAME: {
+            "Keys": [
+                {"restaurant_name": {"S": name}, "slot": {"S": slot.key}}
+                for name in restaurant_names
+            ],
+            "ProjectionExpression": "restaurant_name, booked_persons",
+            "ConsistentRead": True,
+        }
+    }
 
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        if attempt > 0:
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, 0.05 * 2**attempt))
 
-def _get_total_reservations_persons(restaurant_name):
-    reservations = reservations_table.scan(
-        FilterExpression=Key("restaurant_name").eq(restaurant_name)
-    )["Items"]
+        response = dynamodb_client.batch_get_item(RequestItems=request_items)
+        for item in response["Responses"].get(BOOKED_CAPACITY_DYNAMODB_TABLE_NAME, []):
+            booked_persons[item["restaurant_name"]["S"]] = int(
+                item["booked_persons"]["N"]
+            )
 
-    if reservations:
-        return sum([int(r["number_of_persons"]) for r in reservations])
+        request_items = response.get("UnprocessedKeys") or {}
+        if not request_items:
+            break
+    else:
+        raise RuntimeError(
+            f"Booked capacity not read after {BATCH_GET_MAX_ATTEMPTS} attempts"
+        )
 
-    return 0
+    return booked_persons
 
 
-def main(event, context):
+def _check_availability(restaurant_metadata, slot):
+    capacity_persons = restaurant_metadata["capacity_persons"]
+    total_reservations_persons = _get_booked_persons(
+        restaurant_metadata["restaurant_name"], slot
+    )
 
-    print(json.dumps(event, indent=4))
+    remaining_capacity_persons = capacity_persons - total_reservations_persons
+
+    if remaining_capacity_persons <= 0:
+        return (
+            f"The restaurant is fully booked {slot.describe()}. "
+            f"Remaining capacity is {remaining_capacity_persons} persons."
+        )
 
+    return (
+        f"There is availability for {remaining_capacity_persons} persons "
+        f"{slot.describe()}."
+    )
+
+
+def _check_restaurant_availability(event, slot):
     restaurant_name = _get_parameter(event, "restaurant_name")
-    restaurant_metadata = _get_metadata(restaurant_name)
+    restaurant_metadata, candidates = _get_metadata(restaurant_name)
 
-    capacity_persons = restaurant_metadata["capacity_persons"]
-    total_reservations_persons = _get_total_reservations_persons(restaurant_name)
+    if restaurant_metadata is None:
+        return unknown_restaurant_message(restaurant_name, candidates)
 
-    remaining_capacity_persons = capacity_persons - total_reservations_persons
+    response = _check_availability(restaurant_metadata, slot)
 
-    if remaining_capacity_persons <= 0:
+    # The agent should use the exact name from now on
+    if restaurant_metadata["restaurant_name"] != restaurant_name:
         response = (
-            "The restaurant is fully booked. "
-            f"Remaining capacity is {remaining_capacity_persons} persons."
+            f"The exact name of the restaurant is "
+            f"{restaurant_metadata['restaurant_name']}. {response}"
         )
-    else:
-        response = f"There is availability for {remaining_capacity_persons} persons."
+
+    return response
+
+
+def _check_availability_bulk(event, slot):
+    requested_names = _parse_restaurant_names(_get_parameter(event, "restaurant_names"))
+
+    if not requested_names:
+        return "No restaurant names were given."
+    if len(requested_names) > MAX_BULK_RESTAURANTS:
+        return (
+            f"Too many restaurants, check the availability of at most "
+            f"{MAX_BULK_RESTAURANTS} restaurants at a time."
+        )
+
+    found = {}
+    unknown = []
+    for requested_name in requested_names:
+        restaurant_metadata, candidates = _get_metadata(requested_name)
+        if restaurant_metadata is None:
+            unknown.append(unknown_restaurant_message(requested_name, candidates))
+        else:
+            found[restaurant_metadata["restaurant_name"]] = restaurant_metadata
+
+    lines = []
+    if found:
+        booked_persons = _get_booked_persons_bulk(list(found.keys()), slot)
+
+        lines.append("restaurant_name|remaining_capacity_persons")
+        for restaurant_name, restaurant_metadata in found.items():
+            remaining_capacity_persons = (
+                restaurant_metadata["capacity_persons"]
+                - booked_persons[restaurant_name]
+            )
+            lines.append(f"{restaurant_name}|{remaining_capacity_persons}")
+
+        lines.append(
+            f"Remaining capacities are {slot.describe()}. "
+            "Restaurants with remaining capacity 0 or less are fully booked. "
+            "Use the exact restaurant names above from now on."
+        )
+
+    return "\n".join(lines + unknown)
+
+
+def main(event, context):
+
+    print(json.dumps(event, indent=4))
+
+    try:
+        slot = parse_slot(
+            _get_parameter(event, "reservation_date"),
+            _get_parameter(event, "reservation_time"),
+            slot_settings,
+        )
+
+        if event["function"] == "check_availability_bulk":
+            response = _check_availability_bulk(event, slot)
+        else:
+            response = _check_restaurant_availability(event, slot)
+    except InvalidSlot as e:
+        response = str(e)
 
     return {
         "messageVersion": "1.0",
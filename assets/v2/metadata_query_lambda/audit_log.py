@@ -0,0 +1,101 @@
+import time
+import random
+import threading
+
+# Maximum number of items in a single BatchWriteItem request
+BATCH_WRITE_MAX_ITEMS = 25
+
+
+class QueryAuditLog:
+    """
+    Buffers audit records of the agent queries in memory and writes them to
+    DynamoDB with BatchWriteItem from a background thread.
+
+    The records are written while the query runs and the response is prepared.
+    The lambda execution environment is frozen as soon as the handler returns,
+    so the handler calls drain() before returning. Records left over when the
+    drain times out are flushed at the start of the next invocation.
+    """
+
+    def __init__(self, dynamodb_client, table_name, max_attempts=5):
+        self.dynamodb_client = dynamodb_client
+        self.table_name = table_name
+        self.max_attempts = max_attempts
+
+        self._records = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, item):
+        with self._lock:
+            self._records.append(item)
+            self._idle.clear()
+        self._wakeup.set()
+
+    def flush(self):
+        """
+        Wakes the writer for the records left over by the previous invocation,
+        returns their number.
+        """
+        with self._lock:
+            pending = len(self._records)
+        if not self._idle.is_set():
+            self._wakeup.set()
+        return pending
+
+    def drain(self, timeout_seconds):
+        """
+        Wait until all buffered records are written. Returns False on timeout.
+        """
+        return self._idle.wait(timeout=max(timeout_seconds, 0))
+
+    def _next_batch(self):
+        with self._lock:
+            batch = self._records[:BATCH_WRITE_MAX_ITEMS]
+            del self._records[:BATCH_WRITE_MAX_ITEMS]
+            if not batch:
+                self._idle.set()
+            return batch
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            batch = self._next_batch()
+            while batch:
+                self._write_batch(batch)
+                batch = self._next_batch()
+
+    def _write_batch(self, batch):
+        request_items = {
+            self.table_name: [{"PutRequest": {"Item": item}} for item in batch]
+        }
+
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, 0.05 * 2**attempt))
+
+            try:
+                response = self.dynamodb_client.batch_write_item(
+                    RequestItems=request_items
+                )
+            except Exception as e:
+                # Auditing should never break the agent
+                print(f"Failed to write query audit records: {e}")
+                continue
+
+            request_items = response.get("UnprocessedItems") or {}
+            if not request_items:
+                return
+
+        dropped = sum(len(requests) for requests in request_items.values())
+        print(
+            f"Dropped {dropped} query audit records after {self.max_attempts} attempts"
+        )
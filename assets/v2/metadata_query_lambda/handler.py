@@ -1,71 +1,200 @@
 import os
+import time
 import boto3
 import json
 from datetime import datetime, timezone
 
-import pandas as pd
-from pandasql import sqldf
-from pandasql.sqldf import PandaSQLException
+from restaurants_db import RestaurantsDatabase, QueryLimits, QueryError, QueryRejected
+from query_cache import QueryResultCache
+from audit_log import QueryAuditLog
+from metadata_loader import S3MetadataLoader, METADATA_SNAPSHOT_SUFFIX
 
 METADATA_S3_BUCKET = os.environ["METADATA_S3_BUCKET"]
 METADATA_S3_KEY = os.environ["METADATA_S3_KEY"]
 DYNAMODB_TABLE_NAME = os.environ["DYNAMODB_TABLE_NAME"]
+METADATA_ENGINE_MODE = os.environ.get("METADATA_ENGINE_MODE", "pandas")
+METADATA_REFRESH_SECONDS = int(os.environ.get("METADATA_REFRESH_SECONDS", "60"))
 
-# Limit the results to 50, because otherwise the lambda cannot handle the response
-MAX_RESULTS = 50
+# Results are split in pages because the agent cannot handle large responses
+MAX_RESPONSE_BYTES = int(os.environ.get("MAX_RESPONSE_BYTES", "20000"))
+
+# Session attribute that holds the continuation token for next_page
+CURSOR_SESSION_ATTRIBUTE = "find_restaurants_cursor"
+
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "256"))
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", str(8 * 1024**2)))
+QUERY_CACHE_TTL_SECONDS = int(os.environ.get("QUERY_CACHE_TTL_SECONDS", "900"))
+
+# Time kept aside after a query to prepare the response before the lambda times out
+QUERY_DEADLINE_MARGIN_MILLIS = 2000
+
+# Time kept aside to return the response after draining the audit log
+AUDIT_LOG_DRAIN_MARGIN_MILLIS = 500
+
+
+# Memory of the runtime with pandas, boto3 and the metadata loaded, measured
+# at about 85 MB of RSS, with room for the data frame of the query results.
+# The rest of the function memory is left to the SQLite heap.
+BASELINE_MEMORY_MB = int(os.environ.get("BASELINE_MEMORY_MB", "128"))
+FUNCTION_MEMORY_MB = int(os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "256"))
+MIN_QUERY_HEAP_MB = 16
 
 
-s3_resource = boto3.resource("s3")
 dynamodb_client = boto3.client("dynamodb")
 
+query_limits = QueryLimits(
+    max_instructions=int(os.environ.get("QUERY_MAX_INSTRUCTIONS", "100000000")),
+    max_seconds=float(os.environ.get("QUERY_MAX_SECONDS", "5")),
+    max_rows=int(os.environ.get("QUERY_MAX_ROWS", "10000")),
+    max_heap_bytes=int(
+        os.environ.get(
+            "QUERY_MAX_HEAP_BYTES",
+            str(
+                max(FUNCTION_MEMORY_MB - BASELINE_MEMORY_MB, MIN_QUERY_HEAP_MB)
+                * 1024**2
+            ),
+        )
+    ),
+)
+
 
-def _load_metadata_json():
-    metadata_object = s3_resource.Object(METADATA_S3_BUCKET, METADATA_S3_KEY)
-    metadata_content = metadata_object.get()["Body"].read().decode("utf-8")
-    metadata_json = json.loads(metadata_content)
-    df = pd.DataFrame(metadata_json)
-    df["dishes"] = df["dishes"].apply(lambda dishes: ", ".join(dishes))
+def _build_restaurants_database(metadata_content):
+    # The prebuilt snapshot is opened as it is, the JSON is parsed and indexed
+    if METADATA_S3_KEY.endswith(METADATA_SNAPSHOT_SUFFIX):
+        return RestaurantsDatabase.from_snapshot(
+            metadata_content, mode=METADATA_ENGINE_MODE, limits=query_limits
+        )
+
+    metadata_json = json.loads(metadata_content.decode("utf-8"))
+
+    return RestaurantsDatabase.from_metadata_json(
+        metadata_json, mode=METADATA_ENGINE_MODE, limits=query_limits
+    )
 
-    return df
 
+# Built at cold start and rebuilt only when the metadata in S3 changes.
+# The version (ETag) identifies the data the query results are based on.
+restaurants_metadata = S3MetadataLoader(
+    METADATA_S3_BUCKET,
+    METADATA_S3_KEY,
+    build_index=_build_restaurants_database,
+    refresh_interval_seconds=METADATA_REFRESH_SECONDS,
+)
 
-restaurants = _load_metadata_json()
+query_cache = QueryResultCache(
+    max_entries=QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=QUERY_CACHE_MAX_BYTES,
+    ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+)
+
+# Store the queries in a DynamoDB table for debugging
+query_audit_log = QueryAuditLog(dynamodb_client, DYNAMODB_TABLE_NAME)
 
 
 def _get_parameter(event, param_name):
     return next(p for p in event["parameters"] if p["name"] == param_name)["value"]
 
 
-def main(event, context):
+def _get_query_max_seconds(context):
+    # The query is stopped before the lambda times out, so that the agent
+    # gets an answer it can act on instead of a failed invocation.
+    return (
+        context.get_remaining_time_in_millis() - QUERY_DEADLINE_MARGIN_MILLIS
+    ) / 1000
 
-    print(json.dumps(event, indent=4))
 
-    sql_query = _get_parameter(event, "sql_query")
+def _run_query(metadata, sql_query, max_seconds):
+    cached = query_cache.get(sql_query, metadata.version)
+    if cached is None:
+        records = metadata.index.query(sql_query, max_seconds=max_seconds)
+        # The serialized size of each record is needed to split the results in pages
+        records_sizes = [len(_to_json(r)) for r in records]
+        cached = (records, records_sizes)
+        query_cache.put(sql_query, metadata.version, cached, sum(records_sizes))
 
-    timestamp_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return cached
 
-    # Store the query in a DynamoDB table for debugging
-    dynamodb_client.put_item(
-        TableName=DYNAMODB_TABLE_NAME,
-        Item={
-            "timestamp_utc": {"S": timestamp_utc},
-            "sql_query": {"S": sql_query},
-        },
+
+def _to_json(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _get_page(records, records_sizes, offset):
+    """
+    Returns the records that fit in the response starting from the offset.
+    """
+    end = offset
+    page_bytes = 2
+    while end < len(records):
+        # Always return at least one record
+        if end > offset and page_bytes + records_sizes[end] + 1 > MAX_RESPONSE_BYTES:
+            break
+        page_bytes += records_sizes[end] + 1
+        end += 1
+
+    return records[offset:end], end
+
+
+def _respond_with_page(
+    metadata, sql_query, records, records_sizes, offset, session_attributes
+):
+    page, end = _get_page(records, records_sizes, offset)
+
+    if end < len(records):
+        session_attributes[CURSOR_SESSION_ATTRIBUTE] = _to_json(
+            {
+                "sql_query": sql_query,
+                "offset": end,
+                "metadata_version": metadata.version,
+            }
+        )
+        return (
+            f"{_to_json(page)}\n"
+            f"These are the results {offset + 1} to {end} out of {len(records)}. "
+            "Call the function next_page to get the next results."
+        )
+
+    session_attributes.pop(CURSOR_SESSION_ATTRIBUTE, None)
+    if offset == 0:
+        return _to_json(page)
+
+    return (
+        f"{_to_json(page)}\n"
+        f"These are the last results {offset + 1} to {end} out of {len(records)}."
     )
 
+
+def _find_restaurants(event, context, metadata, session_attributes):
+    sql_query = _get_parameter(event, "sql_query")
+
+    # Microseconds keep the partition key unique within a batch
+    timestamp_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+    audit_item = {
+        "timestamp_utc": {"S": timestamp_utc},
+        "sql_query": {"S": sql_query},
+    }
+
+    start = time.perf_counter()
     try:
-        df = sqldf(sql_query)
-
-        if df.shape[0] > MAX_RESULTS:
-            # Let's see if the agent can use this message and adjust the query
-            response = (
-                f"The query returned more results than the maximum which is {MAX_RESULTS}. "
-                "Make your query more specific or just add a "
-                f"LIMIT clause to limit the results to {MAX_RESULTS}."
-            )
-        else:
-            response = df.to_json(orient="records", index=False)
-    except PandaSQLException as e:
+        records, records_sizes = _run_query(
+            metadata, sql_query, _get_query_max_seconds(context)
+        )
+        audit_item["row_count"] = {"N": str(len(records))}
+
+        response = _respond_with_page(
+            metadata, sql_query, records, records_sizes, 0, session_attributes
+        )
+    except QueryRejected as e:
+        audit_item["error_class"] = {"S": type(e).__name__}
+        session_attributes.pop(CURSOR_SESSION_ATTRIBUTE, None)
+        response = (
+            f"The query was rejected because {str(e)}. "
+            "Make the query more specific, for example add join conditions, "
+            "filters in the WHERE clause or a LIMIT clause."
+        )
+    except QueryError as e:
+        audit_item["error_class"] = {"S": type(e.__cause__ or e).__name__}
+        session_attributes.pop(CURSOR_SESSION_ATTRIBUTE, None)
         # Give the exception back to the model to see if it can fix the query
         response = (
             f"The query failed, if you think that you can fix your query try again."
@@ -73,6 +202,77 @@ def main(event, context):
             "Do not reveal the exact error to the user."
         )
 
+    execution_time_ms = (time.perf_counter() - start) * 1000
+    audit_item["execution_time_ms"] = {"N": f"{execution_time_ms:.3f}"}
+    query_audit_log.add(audit_item)
+
+    return response
+
+
+def _next_page(context, metadata, session_attributes):
+    cursor = session_attributes.get(CURSOR_SESSION_ATTRIBUTE)
+    if not cursor:
+        return "There are no more results. Use find_restaurants to run a new query."
+
+    cursor = json.loads(cursor)
+    if cursor["metadata_version"] != metadata.version:
+        session_attributes.pop(CURSOR_SESSION_ATTRIBUTE, None)
+        return (
+            "The restaurant data has changed since the query was made. "
+            "Use find_restaurants to run the query again."
+        )
+
+    # Normally served from the cache, otherwise the query runs again
+    # on the same version of the data and gives the same results.
+    try:
+        records, records_sizes = _run_query(
+            metadata, cursor["sql_query"], _get_query_max_seconds(context)
+        )
+    except QueryError as e:
+        session_attributes.pop(CURSOR_SESSION_ATTRIBUTE, None)
+        return (
+            f"The next results could not be retrieved because {str(e)}. "
+            "Use find_restaurants to run the query again."
+        )
+
+    return _respond_with_page(
+        metadata,
+        cursor["sql_query"],
+        records,
+        records_sizes,
+        cursor["offset"],
+        session_attributes,
+    )
+
+
+def main(event, context):
+
+    print(json.dumps(event, indent=4))
+
+    session_attributes = dict(event["sessionAttributes"])
+
+    # Written in the background while this invocation runs
+    pending_audit_records = query_audit_log.flush()
+    if pending_audit_records:
+        print(f"Flushing {pending_audit_records} query audit records")
+
+    metadata = restaurants_metadata.get()
+
+    if event["function"] == "next_page":
+        response = _next_page(context, metadata, session_attributes)
+    else:
+        response = _find_restaurants(event, context, metadata, session_attributes)
+
+    print(f"Query cache {query_cache.stats()}")
+
+    # The audit records need to be written before the environment is frozen,
+    # the writes are bounded by the time left in the invocation.
+    drain_timeout_millis = (
+        context.get_remaining_time_in_millis() - AUDIT_LOG_DRAIN_MARGIN_MILLIS
+    )
+    if not query_audit_log.drain(drain_timeout_millis / 1000):
+        print("Query audit log not drained, records are flushed in the next invocation")
+
     return {
         "messageVersion": "1.0",
         "response": {
@@ -80,6 +280,6 @@ def main(event, context):
             "function": event["function"],
             "functionResponse": {"responseBody": {"TEXT": {"body": response}}},
         },
-        "sessionAttributes": event["sessionAttributes"],
+        "sessionAttributes": session_attributes,
         "promptSessionAttributes": event["promptSessionAttributes"],
     }
@@ -0,0 +1,235 @@
+import re
+import time
+from collections import OrderedDict
+
+# Keywords are case insensitive and can be normalized safely, except in the
+# result columns (see normalize_sql). Identifiers are kept as they are.
+SQL_KEYWORDS = {
+    "all",
+    "and",
+    "as",
+    "asc",
+    "avg",
+    "between",
+    "by",
+    "case",
+    "cast",
+    "count",
+    "cross",
+    "desc",
+    "distinct",
+    "else",
+    "end",
+    "escape",
+    "except",
+    "exists",
+    "from",
+    "glob",
+    "group",
+    "having",
+    "in",
+    "inner",
+    "intersect",
+    "is",
+    "join",
+    "left",
+    "like",
+    "limit",
+    "lower",
+    "materialized",
+    "max",
+    "min",
+    "not",
+    "null",
+    "offset",
+    "on",
+    "or",
+    "order",
+    "outer",
+    "over",
+    "partition",
+    "recursive",
+    "round",
+    "row_number",
+    "rank",
+    "select",
+    "sum",
+    "then",
+    "union",
+    "upper",
+    "using",
+    "when",
+    "where",
+    "window",
+    "with",
+}
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<space>\s+)
+    |(?P<operator><>|!=|<=|>=|==|\|\||.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+# Clauses that end the result columns of a SELECT
+_RESULT_COLUMNS_END = {
+    "except",
+    "from",
+    "group",
+    "having",
+    "intersect",
+    "limit",
+    "order",
+    "union",
+    "where",
+    "window",
+}
+
+
+def _tokenize(sql_query):
+    """
+    Yields the kind, the text and the end position of each token.
+    """
+    for match in _TOKEN_PATTERN.finditer(sql_query):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        token = match.group()
+        if kind == "word" and token.lower() in SQL_KEYWORDS:
+            kind, token = "keyword", token.lower()
+        yield kind, token, match.end()
+
+
+def normalize_sql(sql_query):
+    """
+    Canonical form of a query, used as the cache key.
+
+    Comments, whitespace, keyword casing, trailing semicolons and the optional
+    AS in front of an alias do not change the result of a query.
+
+    The result columns of each SELECT are kept as they are written: SQLite
+    names a column without an alias by the text of its expression, so e.g.
+    COUNT(*) and count(*) give the same rows under different column names.
+    """
+    tokens = list(_tokenize(sql_query))
+
+    while tokens and tokens[-1][:2] == ("operator", ";"):
+        tokens.pop()
+
+    normalized = []
+    # Keep track of parentheses that belong to a CAST(... AS type)
+    parentheses = []
+    # Start position and parentheses depth of the result columns being read
+    result_columns = None
+    for i, (kind, token, end) in enumerate(tokens):
+        if result_columns is not None:
+            start, depth = result_columns
+            at_depth = len(parentheses) == depth
+            if not (at_depth and (token == ")" or token in _RESULT_COLUMNS_END)):
+                if token == "(":
+                    parentheses.append(False)
+                elif token == ")":
+                    parentheses.pop()
+                continue
+
+            normalized.append(sql_query[start : tokens[i - 1][2]].strip())
+            result_columns = None
+
+        if token == "(":
+            after_cast = bool(normalized) and normalized[-1] == "cast"
+            parentheses.append(after_cast)
+        elif token == ")" and parentheses:
+            parentheses.pop()
+        elif token == "as" and not (parentheses and parentheses[-1]):
+            next_kind = tokens[i + 1][0] if i + 1 < len(tokens) else None
+            if next_kind in ("word", "quoted"):
+                continue
+        elif token == "select":
+            result_columns = (end, len(parentheses))
+        normalized.append(token)
+
+    if result_columns is not None:
+        normalized.append(sql_query[result_columns[0] : tokens[-1][2]].strip())
+
+    return " ".join(token for token in normalized if token)
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results bounded by number of entries and total size.
+
+    Entries expire after a TTL and are all dropped as soon as
+    the version of the restaurant metadata changes.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl_seconds):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._metadata_version = None
+
+    def _check_metadata_version(self, metadata_version):
+        if metadata_version != self._metadata_version:
+            self._entries.clear()
+            self._total_bytes = 0
+            self._metadata_version = metadata_version
+
+    def _evict(self, key):
+        _, size_bytes, _ = self._entries.pop(key)
+        self._total_bytes -= size_bytes
+
+    def get(self, sql_query, metadata_version):
+        self._check_metadata_version(metadata_version)
+        key = normalize_sql(sql_query)
+
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+            self._evict(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, sql_query, metadata_version, result, size_bytes):
+        self._check_metadata_version(metadata_version)
+        key = normalize_sql(sql_query)
+
+        if key in self._entries:
+            self._evict(key)
+
+        if size_bytes > self.max_bytes:
+            return
+
+        self._entries[key] = (result, size_bytes, time.monotonic())
+        self._total_bytes += size_bytes
+
+        while (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            self._evict(next(iter(self._entries)))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (
+            f"hits: {self.hits}, misses: {self.misses}, hit rate: {hit_rate:.2%}, "
+            f"entries: {len(self._entries)}, bytes: {self._total_bytes}"
+        )
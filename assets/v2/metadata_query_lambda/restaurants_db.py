@@ -0,0 +1,507 @@
+import re
+import time
+import sqlite3
+from dataclasses import dataclass
+
+RESTAURANTS_TABLE = "restaurants"
+
+RESTAURANTS_COLUMNS = {
+    "district_name": "TEXT",
+    "restaurant_name": "TEXT",
+    "restaurant_cuisine": "TEXT",
+    "signature_dish": "TEXT",
+    "dishes": "TEXT",
+    "average_price_per_person": "INTEGER",
+    "rating_food_stars": "INTEGER",
+    "rating_service_stars": "INTEGER",
+    "capacity_persons": "INTEGER",
+}
+
+# Columns the agent typically filters, groups, sorts or joins by
+INDEXED_COLUMNS = [
+    "district_name",
+    "restaurant_name",
+    "restaurant_cuisine",
+    "signature_dish",
+    "average_price_per_person",
+    "rating_food_stars",
+    "rating_service_stars",
+]
+
+# One row per dish of each restaurant, so that dishes can be looked up with an index
+RESTAURANT_DISHES_TABLE = "restaurant_dishes"
+
+# Full-text index over the dishes and the signature dish of each restaurant
+RESTAURANT_DISHES_FTS_TABLE = "restaurant_dishes_fts"
+
+# Aggregates precomputed at load time, the value 'All' stands for
+# all districts, all cuisines or both.
+DISTRICT_CUISINE_STATS_TABLE = "district_cuisine_stats"
+DISTRICT_DISH_STATS_TABLE = "district_dish_stats"
+RESTAURANT_RANKINGS_TABLE = "restaurant_rankings"
+ALL_VALUES = "All"
+
+# Number of restaurants kept in each ranking
+RANKINGS_TOP_N = 10
+
+RANKINGS = {
+    "cheapest": "average_price_per_person ASC",
+    "most_expensive": "average_price_per_person DESC",
+    "best_food": "rating_food_stars DESC, rating_service_stars DESC",
+    "best_service": "rating_service_stars DESC, rating_food_stars DESC",
+}
+
+STATS_COLUMNS = {
+    "restaurant_count": ("COUNT(*)", "INTEGER"),
+    "min_price": ("MIN(average_price_per_person)", "INTEGER"),
+    "avg_price": ("AVG(average_price_per_person)", "REAL"),
+    "max_price": ("MAX(average_price_per_person)", "INTEGER"),
+    "avg_rating_food_stars": ("AVG(rating_food_stars)", "REAL"),
+    "avg_rating_service_stars": ("AVG(rating_service_stars)", "REAL"),
+    "total_capacity_persons": ("SUM(capacity_persons)", "INTEGER"),
+}
+
+# The pandas mode loads the data through a DataFrame,
+# the stdlib mode avoids importing pandas altogether.
+ENGINE_MODE_PANDAS = "pandas"
+ENGINE_MODE_STDLIB = "stdlib"
+ENGINE_MODES = [ENGINE_MODE_PANDAS, ENGINE_MODE_STDLIB]
+
+
+# Stored in the user_version of the snapshot file, increment it
+# whenever the tables of the database change.
+SNAPSHOT_SCHEMA_VERSION = 1
+
+# The progress handler is called every that many virtual machine instructions
+PROGRESS_HANDLER_INSTRUCTIONS = 10_000
+
+# Chunk size when the pandas mode reads the results of a query
+PANDAS_CHUNK_SIZE = 1_000
+
+# Only reading is allowed when a query is prepared
+ALLOWED_AUTHORIZER_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+# The full-text index reads this pragma internally
+ALLOWED_PRAGMAS = {"data_version"}
+
+
+_ALIAS_PATTERN = re.compile(
+    r"(?:\bFROM|\bJOIN|,)\s+(\w+)(?:\s+AS)?\s+(\w+)", re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class QueryLimits:
+    # Virtual machine instructions a single query can execute,
+    # a few seconds so that it is reached before max_seconds
+    max_instructions: int = 100_000_000
+    # Wall clock time a single query can run
+    max_seconds: float = 5.0
+    # Rows a single query can return
+    max_rows: int = 10_000
+    # Length of any string or blob, including intermediate values
+    max_value_bytes: int = 1_000_000
+    # Heap SQLite can allocate, including the database and the sorts,
+    # temporary tables and indexes built while a query runs
+    max_heap_bytes: int = 64 * 1024**2
+    # Upper bound of row combinations estimated from the query plan
+    max_estimated_rows: int = 2_000_000
+
+
+class QueryError(Exception):
+    pass
+
+
+class QueryRejected(QueryError):
+    """
+    The query was stopped because it is too expensive.
+    The message can be given back to the agent as it is.
+    """
+
+    pass
+
+
+def _insert_restaurants_with_pandas(connection, metadata_json):
+    import pandas as pd
+
+    df = pd.DataFrame(metadata_json)
+    df["dishes"] = df["dishes"].apply(lambda dishes: ", ".join(dishes))
+    df = df[list(RESTAURANTS_COLUMNS)]
+
+    df.to_sql(RESTAURANTS_TABLE, connection, index=False, dtype=RESTAURANTS_COLUMNS)
+
+
+def _insert_restaurants_with_stdlib(connection, metadata_json):
+    columns = ", ".join(f"{c} {t}" for c, t in RESTAURANTS_COLUMNS.items())
+    connection.execute(f"CREATE TABLE {RESTAURANTS_TABLE} ({columns})")
+
+    placeholders = ", ".join("?" for _ in RESTAURANTS_COLUMNS)
+    connection.executemany(
+        f"INSERT INTO {RESTAURANTS_TABLE} VALUES ({placeholders})",
+        (
+            tuple(
+                ", ".join(m[c]) if c == "dishes" else m[c] for c in RESTAURANTS_COLUMNS
+            )
+            for m in metadata_json
+        ),
+    )
+
+
+def _create_restaurant_dishes(connection, metadata_json):
+    connection.execute(
+        f"CREATE TABLE {RESTAURANT_DISHES_TABLE} ("
+        "restaurant_name TEXT, dish TEXT COLLATE NOCASE, is_signature_dish INTEGER)"
+    )
+
+    rows = []
+    for m in metadata_json:
+        dishes = list(dict.fromkeys([m["signature_dish"], *m["dishes"]]))
+        rows.extend(
+            (m["restaurant_name"], dish, int(dish == m["signature_dish"]))
+            for dish in dishes
+        )
+    connection.executemany(
+        f"INSERT INTO {RESTAURANT_DISHES_TABLE} VALUES (?, ?, ?)", rows
+    )
+
+    connection.execute(
+        f"CREATE INDEX idx_{RESTAURANT_DISHES_TABLE}_dish "
+        f"ON {RESTAURANT_DISHES_TABLE} (dish, restaurant_name)"
+    )
+    connection.execute(
+        f"CREATE INDEX idx_{RESTAURANT_DISHES_TABLE}_restaurant_name "
+        f"ON {RESTAURANT_DISHES_TABLE} (restaurant_name)"
+    )
+
+
+def _create_restaurant_dishes_fts(connection):
+    try:
+        connection.execute(
+            f"CREATE VIRTUAL TABLE {RESTAURANT_DISHES_FTS_TABLE} "
+            "USING fts5(restaurant_name UNINDEXED, dishes, signature_dish)"
+        )
+    except sqlite3.OperationalError as e:
+        print(f"Full-text index is not available: {e}")
+        return
+
+    connection.execute(
+        f"INSERT INTO {RESTAURANT_DISHES_FTS_TABLE} "
+        f"SELECT restaurant_name, dishes, signature_dish FROM {RESTAURANTS_TABLE}"
+    )
+
+
+def _create_aggregates(connection):
+    # Each grouping column is also replaced by 'All' to get the totals
+    district_scopes = ["district_name", f"'{ALL_VALUES}'"]
+    cuisine_scopes = ["restaurant_cuisine", f"'{ALL_VALUES}'"]
+
+    stats_schema = ", ".join(f"{c} {t}" for c, (_, t) in STATS_COLUMNS.items())
+    stats_expressions = ", ".join(e for e, _ in STATS_COLUMNS.values())
+
+    connection.execute(
+        f"CREATE TABLE {DISTRICT_CUISINE_STATS_TABLE} ("
+        f"district_name TEXT, restaurant_cuisine TEXT, {stats_schema})"
+    )
+    for district in district_scopes:
+        for cuisine in cuisine_scopes:
+            connection.execute(
+                f"INSERT INTO {DISTRICT_CUISINE_STATS_TABLE} "
+                f"SELECT {district}, {cuisine}, {stats_expressions} "
+                f"FROM {RESTAURANTS_TABLE} GROUP BY 1, 2"
+            )
+    connection.execute(
+        f"CREATE UNIQUE INDEX idx_{DISTRICT_CUISINE_STATS_TABLE} "
+        f"ON {DISTRICT_CUISINE_STATS_TABLE} (restaurant_cuisine, district_name)"
+    )
+
+    connection.execute(
+        f"CREATE TABLE {DISTRICT_DISH_STATS_TABLE} ("
+        f"district_name TEXT, dish TEXT COLLATE NOCASE, {stats_schema})"
+    )
+    for district in district_scopes:
+        connection.execute(
+            f"INSERT INTO {DISTRICT_DISH_STATS_TABLE} "
+            f"SELECT {district}, dish, {stats_expressions} "
+            f"FROM {RESTAURANTS_TABLE} JOIN {RESTAURANT_DISHES_TABLE} USING (restaurant_name) "
+            "GROUP BY 1, 2"
+        )
+    connection.execute(
+        f"CREATE UNIQUE INDEX idx_{DISTRICT_DISH_STATS_TABLE} "
+        f"ON {DISTRICT_DISH_STATS_TABLE} (dish, district_name)"
+    )
+
+    connection.execute(
+        f"CREATE TABLE {RESTAURANT_RANKINGS_TABLE} ("
+        "ranking TEXT, district_name TEXT, restaurant_cuisine TEXT, rank_position INTEGER, "
+        "restaurant_name TEXT, average_price_per_person INTEGER, "
+        "rating_food_stars INTEGER, rating_service_stars INTEGER)"
+    )
+    for ranking, order_by in RANKINGS.items():
+        for district in district_scopes:
+            for cuisine in cuisine_scopes:
+                connection.execute(
+                    f"INSERT INTO {RESTAURANT_RANKINGS_TABLE} "
+                    "SELECT * FROM ("
+                    f"SELECT '{ranking}', {district}, {cuisine}, "
+                    f"ROW_NUMBER() OVER (PARTITION BY {district}, {cuisine} "
+                    f"ORDER BY {order_by}, restaurant_name) AS rank_position, "
+                    "restaurant_name, average_price_per_person, "
+                    "rating_food_stars, rating_service_stars "
+                    f"FROM {RESTAURANTS_TABLE}"
+                    f") WHERE rank_position <= {RANKINGS_TOP_N}"
+                )
+    connection.execute(
+        f"CREATE INDEX idx_{RESTAURANT_RANKINGS_TABLE} ON {RESTAURANT_RANKINGS_TABLE} "
+        "(ranking, district_name, restaurant_cuisine, rank_position)"
+    )
+
+
+def _check_engine_mode(mode):
+    if mode not in ENGINE_MODES:
+        raise ValueError(
+            f"Unknown engine mode '{mode}', expected one of {ENGINE_MODES}"
+        )
+
+
+class RestaurantsDatabase:
+
+    def __init__(self, connection, mode=ENGINE_MODE_STDLIB, limits=QueryLimits()):
+        """
+        Use from_metadata_json() or from_snapshot() to create the database.
+        """
+        _check_engine_mode(mode)
+
+        self.mode = mode
+        self.limits = limits
+        self.connection = connection
+
+        # Used when estimating the cost of a query plan
+        self._table_rows = {
+            table: self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[
+                0
+            ]
+            for (table,) in self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
+        }
+        self._max_table_rows = max(self._table_rows.values())
+
+        # The agent should never be able to modify the data
+        self.connection.execute("PRAGMA query_only = ON")
+        # Intermediate results are kept in memory instead of temporary files,
+        # so that they count towards the heap limit. The limit is shared by
+        # all the connections of the process.
+        self.connection.execute("PRAGMA temp_store = MEMORY")
+        self.connection.execute(f"PRAGMA hard_heap_limit = {limits.max_heap_bytes}")
+        self.connection.set_authorizer(self._authorize)
+
+        self.connection.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, limits.max_value_bytes)
+        self.connection.set_progress_handler(
+            self._check_progress, PROGRESS_HANDLER_INSTRUCTIONS
+        )
+        self._deadline = None
+        self._max_seconds = limits.max_seconds
+        self._remaining_progress_calls = 0
+        self._abort_reason = None
+
+    @classmethod
+    def from_metadata_json(
+        cls, metadata_json, mode=ENGINE_MODE_STDLIB, limits=QueryLimits()
+    ):
+        """
+        Builds the tables, indexes and aggregates from the restaurant metadata.
+        """
+        _check_engine_mode(mode)
+
+        # A single in-memory database is built once per container and
+        # all the queries of the agent run against it.
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+
+        if mode == ENGINE_MODE_PANDAS:
+            _insert_restaurants_with_pandas(connection, metadata_json)
+        else:
+            _insert_restaurants_with_stdlib(connection, metadata_json)
+
+        for column in INDEXED_COLUMNS:
+            connection.execute(
+                f"CREATE INDEX idx_{RESTAURANTS_TABLE}_{column} "
+                f"ON {RESTAURANTS_TABLE} ({column})"
+            )
+
+        _create_restaurant_dishes(connection, metadata_json)
+        _create_restaurant_dishes_fts(connection)
+        _create_aggregates(connection)
+
+        # Collect statistics so that the query planner picks the right index
+        connection.execute("ANALYZE")
+        connection.execute(f"PRAGMA user_version = {SNAPSHOT_SCHEMA_VERSION}")
+        connection.commit()
+
+        return cls(connection, mode=mode, limits=limits)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, mode=ENGINE_MODE_STDLIB, limits=QueryLimits()):
+        """
+        Opens a snapshot written by save_snapshot(), the tables, indexes and
+        aggregates are already built so nothing is parsed or rebuilt.
+        """
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        connection.deserialize(snapshot)
+
+        (schema_version,) = connection.execute("PRAGMA user_version").fetchone()
+        if schema_version != SNAPSHOT_SCHEMA_VERSION:
+            connection.close()
+            raise ValueError(
+                f"Metadata snapshot has schema version {schema_version}, "
+                f"expected {SNAPSHOT_SCHEMA_VERSION}. Regenerate the snapshot."
+            )
+
+        return cls(connection, mode=mode, limits=limits)
+
+    def save_snapshot(self, path):
+        """
+        Writes the database to a SQLite file that can be opened with from_snapshot().
+        """
+        with sqlite3.connect(path) as target:
+            self.connection.backup(target)
+            # Compact the file, the snapshot is shipped to S3 and read by every cold start
+            target.execute("VACUUM")
+        target.close()
+
+    @staticmethod
+    def _authorize(action, arg1, arg2, *args):
+        if action in ALLOWED_AUTHORIZER_ACTIONS:
+            return sqlite3.SQLITE_OK
+        # Reading a pragma has no value, setting it has a value
+        if action == sqlite3.SQLITE_PRAGMA and arg1 in ALLOWED_PRAGMAS and arg2 is None:
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    def _check_progress(self):
+        if self._deadline is None:
+            return 0
+
+        self._remaining_progress_calls -= 1
+        if self._remaining_progress_calls < 0:
+            self._abort_reason = "it needs too many steps to complete"
+        elif time.monotonic() > self._deadline:
+            self._abort_reason = (
+                f"it runs for more than {self._max_seconds:.1f} seconds"
+            )
+
+        # A non-zero value interrupts the query
+        return 1 if self._abort_reason else 0
+
+    def _check_plan(self, sql_query):
+        """
+        Rejects queries that obviously combine too many rows, e.g. joins without
+        join conditions. Table scans under the same parent in the query plan
+        are nested loops, so their sizes are multiplied.
+        """
+        try:
+            plan = self.connection.execute(f"EXPLAIN QUERY PLAN {sql_query}").fetchall()
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            raise QueryError(str(e)) from e
+
+        # The plan refers to tables by their alias
+        aliases = {
+            alias: table
+            for table, alias in _ALIAS_PATTERN.findall(sql_query)
+            if table in self._table_rows
+        }
+
+        rows_per_parent = {}
+        for _, parent, _, detail in plan:
+            if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW":
+                continue
+            name = detail.split()[1]
+            # Subqueries and unknown names are assumed to be as large as the largest table
+            rows = self._table_rows.get(
+                name, self._table_rows.get(aliases.get(name), self._max_table_rows)
+            )
+            rows_per_parent[parent] = rows_per_parent.get(parent, 1) * rows
+
+        estimated_rows = max(rows_per_parent.values(), default=0)
+        if estimated_rows > self.limits.max_estimated_rows:
+            raise QueryRejected(
+                "it combines too many rows, "
+                "probably some tables are joined without a join condition"
+            )
+
+    def _query_with_pandas(self, sql_query):
+        import pandas as pd
+
+        chunks = []
+        try:
+            for chunk in pd.read_sql_query(
+                sql_query, self.connection, chunksize=PANDAS_CHUNK_SIZE
+            ):
+                chunks.append(chunk)
+                if sum(len(c) for c in chunks) > self.limits.max_rows:
+                    raise QueryRejected(
+                        f"it returns more than {self.limits.max_rows} rows"
+                    )
+        except pd.errors.DatabaseError as e:
+            raise QueryError(str(e)) from e
+        except MemoryError as e:
+            raise QueryRejected("it needs too much memory") from e
+
+        if not chunks:
+            return []
+        df = pd.concat(chunks, ignore_index=True)
+
+        # Missing values become None, so that they are serialized as null
+        df = df.astype(object).where(df.notna(), None)
+
+        return df.to_dict(orient="records")
+
+    def _query_with_stdlib(self, sql_query):
+        try:
+            cursor = self.connection.execute(sql_query)
+            rows = cursor.fetchmany(self.limits.max_rows + 1)
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            raise QueryError(str(e)) from e
+        except MemoryError as e:
+            raise QueryRejected("it needs too much memory") from e
+
+        if len(rows) > self.limits.max_rows:
+            cursor.close()
+            raise QueryRejected(f"it returns more than {self.limits.max_rows} rows")
+
+        columns = [d[0] for d in cursor.description or []]
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    def query(self, sql_query, max_seconds=None):
+        """
+        Run a query and return the results as a list of records.
+
+        max_seconds lowers the time limit of this query,
+        e.g. to the time left before the lambda times out.
+        """
+        self._check_plan(sql_query)
+
+        self._abort_reason = None
+        self._remaining_progress_calls = (
+            self.limits.max_instructions // PROGRESS_HANDLER_INSTRUCTIONS
+        )
+        self._max_seconds = self.limits.max_seconds
+        if max_seconds is not None:
+            self._max_seconds = max(min(self._max_seconds, max_seconds), 0)
+        self._deadline = time.monotonic() + self._max_seconds
+        try:
+            if self.mode == ENGINE_MODE_PANDAS:
+                return self._query_with_pandas(sql_query)
+
+            return self._query_with_stdlib(sql_query)
+        except QueryError as e:
+            if self._abort_reason is not None:
+                raise QueryRejected(self._abort_reason) from e
+            raise
+        finally:
+            self._deadline = None
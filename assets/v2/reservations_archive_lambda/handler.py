@@ -0,0 +1,78 @@
+import os
+import gzip
+import json
+import uuid
+import boto3
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+
+ARCHIVE_S3_BUCKET = os.environ["ARCHIVE_S3_BUCKET"]
+ARCHIVE_S3_PREFIX = os.environ.get("ARCHIVE_S3_PREFIX", "reservations-archive/")
+
+# Only needed to serve the agent, not kept in the archive
+NOT_ARCHIVED_ATTRIBUTES = {"guest_key", "expires_at", "idempotency_key"}
+
+s3_client = boto3.client("s3")
+
+deserializer = TypeDeserializer()
+
+
+def _to_json(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"{type(value)} is not JSON serializable")
+
+
+def _archived_reservation(old_image):
+    return {
+        name: deserializer.deserialize(value)
+        for name, value in old_image.items()
+        if name not in NOT_ARCHIVED_ATTRIBUTES
+    }
+
+
+def main(event, context):
+    """
+    Receives the reservations removed by DynamoDB TTL from the table stream
+    and writes them to S3 as gzipped JSON lines, one object per reservation
+    month and invocation.
+    """
+    reservations_by_month = defaultdict(list)
+
+    for record in event["Records"]:
+        # The event source only passes the TTL deletions, double check anyway
+        if record.get("eventName") != "REMOVE" or "OldImage" not in record.get(
+            "dynamodb", {}
+        ):
+            continue
+
+        reservation = _archived_reservation(record["dynamodb"]["OldImage"])
+        reservation_month = reservation.get("reservation_date", "unknown")[:7]
+        reservations_by_month[reservation_month].append(reservation)
+
+    archived_at = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    for reservation_month, reservations in reservations_by_month.items():
+        body = gzip.compress(
+            "".join(
+                json.dumps(r, default=_to_json, separators=(",", ":")) + "\n"
+                for r in reservations
+            ).encode("utf-8")
+        )
+        key = (
+            f"{ARCHIVE_S3_PREFIX}month={reservation_month}/"
+            f"{archived_at}-{uuid.uuid4().hex}.jsonl.gz"
+        )
+        s3_client.put_object(
+            Bucket=ARCHIVE_S3_BUCKET,
+            Key=key,
+            Body=body,
+            ContentType="application/x-ndjson",
+            ContentEncoding="gzip",
+        )
+
+        print(
+            f"Archived {len(reservations)} reservations to s3://{ARCHIVE_S3_BUCKET}/{key}"
+        )
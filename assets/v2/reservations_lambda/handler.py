@@ -1,45 +1,872 @@
 import os
+import time
+import random
 import boto3
 import json
 from datetime import datetime, timezone
+from botocore.config import Config
+
+from idempotency import idempotency_key, expires_at
+from metadata_loader import S3MetadataLoader, read_restaurants_metadata
+from restaurant_index import RestaurantNameIndex, unknown_restaurant_message
+from reservation_slots import (
+    SlotSettings,
+    InvalidSlot,
+    parse_slot,
+    parse_reservation_id,
+    reservation_id,
+    normalize_guest_name,
+)
 
 DYNAMODB_TABLE_NAME = os.environ["DYNAMODB_TABLE_NAME"]
+GUEST_INDEX_NAME = os.environ["GUEST_INDEX_NAME"]
+BOOKED_CAPACITY_DYNAMODB_TABLE_NAME = os.environ["BOOKED_CAPACITY_DYNAMODB_TABLE_NAME"]
+IDEMPOTENCY_DYNAMODB_TABLE_NAME = os.environ["IDEMPOTENCY_DYNAMODB_TABLE_NAME"]
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+METADATA_S3_BUCKET = os.environ["METADATA_S3_BUCKET"]
+METADATA_S3_KEY = os.environ["METADATA_S3_KEY"]
+METADATA_REFRESH_SECONDS = int(os.environ.get("METADATA_REFRESH_SECONDS", "60"))
+
+# Attempts when the transaction conflicts with a concurrent reservation
+TRANSACTION_MAX_ATTEMPTS = 3
+
+# Upcoming reservations of a guest returned by list_reservations
+MAX_LISTED_RESERVATIONS = 20
+
+# BatchWriteItem writes up to 25 items per request
+MAX_BATCH_RESERVATIONS = 25
+BATCH_WRITE_MAX_ATTEMPTS = 5
+
+# A batch is claimed while it is processed, the claim expires that long
+# after the invocation times out so that a crashed batch can be retried.
+BATCH_CLAIM_MARGIN_SECONDS = 60
 
-dynamodb_client = boto3.client("dynamodb")
+# Time kept aside to roll back or answer before the lambda times out,
+# longer than a call that exhausts the retries of the client.
+DEADLINE_MARGIN_MILLIS = 10_000
+
+CONCURRENT_CHANGES_MESSAGE = (
+    "The reservation was not made because of concurrent changes, try again."
+)
+
+# Adaptive retries slow down the client when DynamoDB is throttling, the
+# attempts and timeouts keep a call well under the 30 seconds lambda timeout.
+dynamodb_client = boto3.client(
+    "dynamodb",
+    config=Config(
+        connect_timeout=1,
+        read_timeout=2,
+        retries={"total_max_attempts": 3, "mode": "adaptive"},
+    ),
+)
+
+slot_settings = SlotSettings.from_environ()
 
 
 def _get_parameter(event, param_name):
     return next(p for p in event["parameters"] if p["name"] == param_name)["value"]
 
 
-def main(event, context):
+def _build_restaurant_name_index(metadata_content):
+    metadata_json = read_restaurants_metadata(METADATA_S3_KEY, metadata_content)
 
-    print(json.dumps(event, indent=4))
+    return RestaurantNameIndex(metadata_json)
+
+
+# The capacity of each restaurant is needed to enforce it when reserving
+restaurants_metadata = S3MetadataLoader(
+    METADATA_S3_BUCKET,
+    METADATA_S3_KEY,
+    build_index=_build_restaurant_name_index,
+    refresh_interval_seconds=METADATA_REFRESH_SECONDS,
+)
+
+
+def _resolve_restaurant(restaurant_name):
+    """
+    Returns the metadata of the restaurant, or None together with
+    a message for the agent when the name is unknown.
+    """
+    name_index = restaurants_metadata.get().index
+
+    restaurant_metadata = name_index.get(restaurant_name)
+    if restaurant_metadata is None:
+        return None, unknown_restaurant_message(
+            restaurant_name, name_index.suggest(restaurant_name)
+        )
+
+    return restaurant_metadata, None
+
+
+class CapacityExceeded(Exception):
+    def __init__(self, remaining_capacity_persons):
+        super().__init__(remaining_capacity_persons)
+        self.remaining_capacity_persons = remaining_capacity_persons
+
+
+class ReservationConflict(Exception):
+    """
+    The transaction was cancelled by a concurrent write and can be retried.
+    """
 
+
+class DuplicateRequest(Exception):
+    """
+    The same request has already been completed, e.g. when the agent retries.
+    """
+
+
+def _get_completed_response(request_key):
+    """
+    Returns the response of a completed request, None if it is unknown or expired.
+    """
+    completed_request = dynamodb_client.get_item(
+        TableName=IDEMPOTENCY_DYNAMODB_TABLE_NAME,
+        Key={"idempotency_key": {"S": request_key}},
+        ConsistentRead=True,
+    ).get("Item")
+
+    # Expired items are deleted by DynamoDB with a delay
+    if completed_request is None or int(completed_request["expires_at"]["N"]) < int(
+        time.time()
+    ):
+        return None
+
+    # A batch that is still being processed has no response yet
+    if "response_body" not in completed_request:
+        return None
+
+    return completed_request["response_body"]["S"]
+
+
+def _get_booked_persons(restaurant_name, slot):
+    booked_capacity = dynamodb_client.get_item(
+        TableName=BOOKED_CAPACITY_DYNAMODB_TABLE_NAME,
+        Key={"restaurant_name": {"S": restaurant_name}, "slot": {"S": slot.key}},
+        ProjectionExpression="booked_persons",
+        ConsistentRead=True,
+    ).get("Item")
+
+    return int(booked_capacity["booked_persons"]["N"]) if booked_capacity else 0
+
+
+def _counter_update(restaurant_name, slot, number_of_persons, capacity_persons):
+    """
+    Adds the persons to the booked persons of the slot, unless the
+    capacity of the restaurant would be exceeded.
+    """
+    return {
+        "TableName": BOOKED_CAPACITY_DYNAMODB_TABLE_NAME,
+        "Key": {"restaurant_name": {"S": restaurant_name}, "slot": {"S": slot.key}},
+        # The counter expires together with the reservations of the slot
+        "UpdateExpression": (
+            "ADD booked_persons :persons, reservation_count :one "
+            "SET expires_at = if_not_exists(expires_at, :expires_at)"
+        ),
+        "ConditionExpression": (
+            "attribute_not_exists(booked_persons) OR booked_persons <= :max_booked"
+        ),
+        "ExpressionAttributeValues": {
+            ":persons": {"N": str(number_of_persons)},
+            ":one": {"N": "1"},
+            ":max_booked": {"N": str(capacity_persons - number_of_persons)},
+            ":expires_at": {"N": str(slot.expires_at(slot_settings.retention_days))},
+        },
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+    }
+
+
+def _new_reservation_item(restaurant_name, slot, main_guest_name, number_of_persons):
+    timestamp_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    return {
+        "restaurant_name": {"S": restaurant_name},
+        "reservation_id": {"S": reservation_id(slot)},
+        "reservation_date": {"S": slot.reservation_date},
+        "reservation_time": {"S": slot.reservation_time},
+        "main_guest_name": {"S": main_guest_name},
+        "guest_key": {"S": normalize_guest_name(main_guest_name)},
+        "number_of_persons": {"N": str(number_of_persons)},
+        "timestamp_utc": {"S": timestamp_utc},
+        # Past reservations are removed by DynamoDB TTL
+        "expires_at": {"N": str(slot.expires_at(slot_settings.retention_days))},
+    }
+
+
+def _write_reservation(reservation_item, slot, capacity_persons, idempotency_item):
+    """
+    Adds the reservation, the booked persons of the slot and the completed
+    request in one transaction. The booked persons may not exceed the capacity.
+    """
+    restaurant_name = reservation_item["restaurant_name"]["S"]
+    number_of_persons = int(reservation_item["number_of_persons"]["N"])
+
+    # Also an empty slot cannot take more persons than the capacity
+    if number_of_persons > capacity_persons:
+        raise CapacityExceeded(
+            capacity_persons - _get_booked_persons(restaurant_name, slot)
+        )
+
+    try:
+        dynamodb_client.transact_write_items(
+            TransactItems=[
+                {
+                    "Update": _counter_update(
+                        restaurant_name, slot, number_of_persons, capacity_persons
+                    )
+                },
+                {
+                    "Put": {
+                        "TableName": DYNAMODB_TABLE_NAME,
+                        "Item": reservation_item,
+                        "ConditionExpression": "attribute_not_exists(reservation_id)",
+                    }
+                },
+                {
+                    "Put": {
+                        "TableName": IDEMPOTENCY_DYNAMODB_TABLE_NAME,
+                        "Item": idempotency_item,
+                        "ConditionExpression": (
+                            "attribute_not_exists(idempotency_key) OR expires_at < :now"
+                        ),
+                        "ExpressionAttributeValues": {
+                            ":now": {"N": str(int(time.time()))}
+                        },
+                    }
+                },
+            ]
+        )
+    except dynamodb_client.exceptions.TransactionCanceledException as e:
+        counter_reason, _, idempotency_reason = e.response.get(
+            "CancellationReasons", [{}, {}, {}]
+        )
+        if idempotency_reason.get("Code") == "ConditionalCheckFailed":
+            raise DuplicateRequest() from e
+        if counter_reason.get("Code") == "ConditionalCheckFailed":
+            counter_item = counter_reason.get("Item")
+            booked_persons = (
+                int(counter_item["booked_persons"]["N"])
+                if counter_item
+                else _get_booked_persons(restaurant_name, slot)
+            )
+            raise CapacityExceeded(capacity_persons - booked_persons) from e
+        raise ReservationConflict() from e
+
+
+def _make_reservation(event, context):
     restaurant_name = _get_parameter(event, "restaurant_name")
     main_guest_name = _get_parameter(event, "main_guest_name")
     number_of_persons = _get_parameter(event, "number_of_persons")
 
-    timestamp_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        number_of_persons = int(number_of_persons)
+    except ValueError:
+        number_of_persons = 0
+    if number_of_persons <= 0:
+        return "The reservation was not made. The number of persons must be a positive number."
+
+    try:
+        slot = parse_slot(
+            _get_parameter(event, "reservation_date"),
+            _get_parameter(event, "reservation_time"),
+            slot_settings,
+        )
+    except InvalidSlot as e:
+        return f"The reservation was not made. {str(e)}"
+
+    restaurant_metadata, unknown_message = _resolve_restaurant(restaurant_name)
+    if restaurant_metadata is None:
+        return unknown_message
+    restaurant_name = restaurant_metadata["restaurant_name"]
+    capacity_persons = restaurant_metadata["capacity_persons"]
+
+    # Parameters are normalized first, so that retries with a different
+    # spelling of the restaurant or the time in the same slot are detected.
+    request_key = idempotency_key(
+        event["sessionId"],
+        event["function"],
+        {
+            "restaurant_name": restaurant_name,
+            "main_guest_name": main_guest_name,
+            "number_of_persons": number_of_persons,
+            "slot": slot.key,
+        },
+    )
+    reservation_item = _new_reservation_item(
+        restaurant_name, slot, main_guest_name, number_of_persons
+    )
+    # Cancelling the reservation also forgets the request, so that the
+    # same reservation can be made again in the session.
+    reservation_item["idempotency_key"] = {"S": request_key}
+    response_body = (
+        f"Reservation was made successfully at {restaurant_name} {slot.describe()}. "
+        f"The reservation id is {reservation_item['reservation_id']['S']}."
+    )
+
+    idempotency_item = {
+        "idempotency_key": {"S": request_key},
+        "response_body": {"S": response_body},
+        "expires_at": {"N": str(expires_at(IDEMPOTENCY_TTL_SECONDS))},
+    }
+
+    completed_response = _get_completed_response(request_key)
+    if completed_response is not None:
+        print(f"Duplicate request {request_key}")
+        response_body = completed_response
+    else:
+        for attempt in range(TRANSACTION_MAX_ATTEMPTS):
+            if attempt > 0:
+                if context.get_remaining_time_in_millis() < DEADLINE_MARGIN_MILLIS:
+                    print(f"No time left for attempt {attempt + 1}")
+                    return CONCURRENT_CHANGES_MESSAGE
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, 0.05 * 2**attempt))
+
+            try:
+                _write_reservation(
+                    reservation_item, slot, capacity_persons, idempotency_item
+                )
+                break
+            except DuplicateRequest:
+                # A concurrent invocation of the same request completed first
+                print(f"Duplicate request {request_key}")
+                response_body = _get_completed_response(request_key) or response_body
+                break
+            except CapacityExceeded as e:
+                return (
+                    f"The reservation was not made, {restaurant_name} does not have "
+                    f"enough capacity {slot.describe()}. Remaining capacity is "
+                    f"{max(e.remaining_capacity_persons, 0)} persons."
+                )
+            except ReservationConflict:
+                print(f"Reservation conflict on attempt {attempt + 1}")
+        else:
+            return CONCURRENT_CHANGES_MESSAGE
 
+    remaining_capacity_persons = capacity_persons - _get_booked_persons(
+        restaurant_name, slot
+    )
+
+    return (
+        f"{response_body} Remaining capacity is {remaining_capacity_persons} persons."
+    )
+
+
+class BatchInProgress(Exception):
+    """
+    The same batch is being processed by a concurrent invocation.
+    """
+
+
+class DeadlineExceeded(Exception):
+    """
+    The batch was stopped to be rolled back before the lambda times out.
+    """
+
+
+def _check_deadline(context):
+    if context.get_remaining_time_in_millis() < DEADLINE_MARGIN_MILLIS:
+        raise DeadlineExceeded()
+
+
+def _parse_batch_reservations(value):
+    """
+    The agent passes the array of reservations as a JSON string.
+    """
+    try:
+        reservations = json.loads(value)
+    except json.JSONDecodeError:
+        return None
+
+    if isinstance(reservations, dict):
+        reservations = [reservations]
+    if not isinstance(reservations, list) or not all(
+        isinstance(r, dict) for r in reservations
+    ):
+        return None
+
+    return reservations
+
+
+def _validate_batch_reservation(reservation):
+    """
+    Returns the normalized reservation, or None together with
+    the reason why it cannot be made.
+    """
+    try:
+        number_of_persons = int(reservation.get("number_of_persons"))
+    except (TypeError, ValueError):
+        number_of_persons = 0
+    if number_of_persons <= 0:
+        return None, "The number of persons must be a positive number."
+
+    main_guest_name = str(reservation.get("main_guest_name") or "").strip()
+    if not main_guest_name:
+        return None, "The name of the main guest is missing."
+
+    try:
+        slot = parse_slot(
+            str(reservation.get("reservation_date", "")),
+            str(reservation.get("reservation_time", "")),
+            slot_settings,
+        )
+    except InvalidSlot as e:
+        return None, str(e)
+
+    restaurant_metadata, unknown_message = _resolve_restaurant(
+        str(reservation.get("restaurant_name", ""))
+    )
+    if restaurant_metadata is None:
+        return None, unknown_message
+
+    return {
+        "restaurant_name": restaurant_metadata["restaurant_name"],
+        "capacity_persons": restaurant_metadata["capacity_persons"],
+        "main_guest_name": main_guest_name,
+        "number_of_persons": number_of_persons,
+        "slot": slot,
+    }, None
+
+
+def _claim_batch(request_key, context):
+    """
+    Marks the batch as being processed, so that a retry of the agent
+    running at the same time does not book the tables twice.
+    """
+    try:
+        dynamodb_client.put_item(
+            TableName=IDEMPOTENCY_DYNAMODB_TABLE_NAME,
+            Item={
+                "idempotency_key": {"S": request_key},
+                "expires_at": {
+                    "N": str(
+                        expires_at(
+                            context.get_remaining_time_in_millis() // 1000
+                            + BATCH_CLAIM_MARGIN_SECONDS
+                        )
+                    )
+                },
+            },
+            ConditionExpression="attribute_not_exists(idempotency_key) OR expires_at < :now",
+            ExpressionAttributeValues={":now": {"N": str(int(time.time()))}},
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException as e:
+        completed_response = _get_completed_response(request_key)
+        if completed_response is None:
+            raise BatchInProgress() from e
+        raise DuplicateRequest(completed_response) from e
+
+
+def _complete_batch(request_key, response_body):
     dynamodb_client.put_item(
-        TableName=DYNAMODB_TABLE_NAME,
+        TableName=IDEMPOTENCY_DYNAMODB_TABLE_NAME,
         Item={
-            "restaurant_name": {"S": restaurant_name},
-            "main_guest_name": {"S": main_guest_name},
-            "number_of_persons": {"N": number_of_persons},
-            "timestamp_utc": {"S": timestamp_utc},
+            "idempotency_key": {"S": request_key},
+            "response_body": {"S": response_body},
+            "expires_at": {"N": str(expires_at(IDEMPOTENCY_TTL_SECONDS))},
+        },
+    )
+
+
+def _release_batch_claim(request_key):
+    # Only the claim is deleted, never the response of a completed batch
+    try:
+        dynamodb_client.delete_item(
+            TableName=IDEMPOTENCY_DYNAMODB_TABLE_NAME,
+            Key={"idempotency_key": {"S": request_key}},
+            ConditionExpression="attribute_not_exists(response_body)",
+        )
+    except Exception as e:
+        # The claim expires shortly after the invocation times out
+        print(f"Failed to release the claim of batch {request_key}: {e}")
+
+
+def _book_capacity(reservation):
+    """
+    Adds the persons of a single reservation of the batch to the booked
+    persons of its slot. Raises CapacityExceeded when they do not fit.
+    """
+    restaurant_name = reservation["restaurant_name"]
+    slot = reservation["slot"]
+    number_of_persons = reservation["number_of_persons"]
+    capacity_persons = reservation["capacity_persons"]
+
+    if number_of_persons > capacity_persons:
+        raise CapacityExceeded(
+            capacity_persons - _get_booked_persons(restaurant_name, slot)
+        )
+
+    try:
+        dynamodb_client.update_item(
+            **_counter_update(
+                restaurant_name, slot, number_of_persons, capacity_persons
+            )
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException as e:
+        counter_item = e.response.get("Item")
+        booked_persons = (
+            int(counter_item["booked_persons"]["N"])
+            if counter_item
+            else _get_booked_persons(restaurant_name, slot)
+        )
+        raise CapacityExceeded(capacity_persons - booked_persons) from e
+
+
+def _release_capacity(reservation_item):
+    slot = parse_reservation_id(reservation_item["reservation_id"]["S"])
+
+    dynamodb_client.update_item(
+        TableName=BOOKED_CAPACITY_DYNAMODB_TABLE_NAME,
+        Key={
+            "restaurant_name": reservation_item["restaurant_name"],
+            "slot": {"S": slot.key},
+        },
+        UpdateExpression="ADD booked_persons :persons, reservation_count :minus_one",
+        ExpressionAttributeValues={
+            ":persons": {"N": f"-{reservation_item['number_of_persons']['N']}"},
+            ":minus_one": {"N": "-1"},
+        },
+    )
+
+
+def _batch_write_reservations(reservation_items, context):
+    """
+    Writes the reservations with BatchWriteItem and returns the ids of the
+    reservations that are still unprocessed after all attempts, or once the
+    lambda is about to time out.
+    """
+    request_items = {
+        DYNAMODB_TABLE_NAME: [
+            {"PutRequest": {"Item": item}} for item in reservation_items
+        ]
+    }
+
+    for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+        if attempt > 0:
+            if context.get_remaining_time_in_millis() < DEADLINE_MARGIN_MILLIS:
+                break
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, 0.05 * 2**attempt))
+
+        response = dynamodb_client.batch_write_item(RequestItems=request_items)
+
+        request_items = response.get("UnprocessedItems") or {}
+        if not request_items:
+            return set()
+
+    return {
+        request["PutRequest"]["Item"]["reservation_id"]["S"]
+        for request in request_items[DYNAMODB_TABLE_NAME]
+    }
+
+
+def _roll_back_batch(reservation_items):
+    """
+    Removes the reservations of a failed batch, which may or may not have
+    been written, and gives their persons back to their slots.
+    """
+    for reservation_item in reservation_items:
+        try:
+            dynamodb_client.delete_item(
+                TableName=DYNAMODB_TABLE_NAME,
+                Key={
+                    "restaurant_name": reservation_item["restaurant_name"],
+                    "reservation_id": reservation_item["reservation_id"],
+                },
+            )
+            _release_capacity(reservation_item)
+        except Exception as e:
+            # The drift is fixed by scripts/reconcile_booked_capacity.py
+            print(
+                f"Failed to roll back reservation "
+                f"{reservation_item['reservation_id']['S']}: {e}"
+            )
+
+
+def _make_reservations_batch(event, context):
+    reservations = _parse_batch_reservations(_get_parameter(event, "reservations"))
+
+    if reservations is None:
+        return (
+            "The reservations were not made. Pass the reservations as a JSON array "
+            "of objects with restaurant_name, main_guest_name, number_of_persons, "
+            "reservation_date and reservation_time."
+        )
+    if not reservations:
+        return "No reservations were given."
+    if len(reservations) > MAX_BATCH_RESERVATIONS:
+        return (
+            f"The reservations were not made. Make at most "
+            f"{MAX_BATCH_RESERVATIONS} reservations at a time."
+        )
+
+    validated = [_validate_batch_reservation(r) for r in reservations]
+
+    # Parameters are normalized first, like for a single reservation
+    request_key = idempotency_key(
+        event["sessionId"],
+        event["function"],
+        [
+            (
+                {
+                    "restaurant_name": r["restaurant_name"],
+                    "main_guest_name": r["main_guest_name"],
+                    "number_of_persons": r["number_of_persons"],
+                    "slot": r["slot"].key,
+                }
+                if r
+                else reservations[i]
+            )
+            for i, (r, _) in enumerate(validated)
+        ],
+    )
+
+    try:
+        _claim_batch(request_key, context)
+    except DuplicateRequest as e:
+        print(f"Duplicate request {request_key}")
+        return e.args[0]
+    except BatchInProgress:
+        return (
+            "The same reservations are still being made, check them with "
+            "list_reservations before trying again."
+        )
+
+    # The capacity is booked one reservation at a time, in the order of the agent,
+    # only the reservations that fit are written.
+    outcomes = []
+    reservation_items = {}
+    try:
+        for i, (reservation, reason) in enumerate(validated):
+            if reservation is None:
+                outcomes.append(f"not made: {reason}")
+                continue
+
+            _check_deadline(context)
+            try:
+                _book_capacity(reservation)
+            except CapacityExceeded as e:
+                outcomes.append(
+                    f"not made: not enough capacity, remaining capacity is "
+                    f"{max(e.remaining_capacity_persons, 0)} persons"
+                )
+                continue
+
+            reservation_items[i] = _new_reservation_item(
+                reservation["restaurant_name"],
+                reservation["slot"],
+                reservation["main_guest_name"],
+                reservation["number_of_persons"],
+            )
+            outcomes.append(
+                f"made: reservation id {reservation_items[i]['reservation_id']['S']}"
+            )
+
+        _check_deadline(context)
+        unprocessed_ids = (
+            _batch_write_reservations(list(reservation_items.values()), context)
+            if reservation_items
+            else set()
+        )
+        for i in list(reservation_items):
+            if reservation_items[i]["reservation_id"]["S"] in unprocessed_ids:
+                _release_capacity(reservation_items[i])
+                del reservation_items[i]
+                outcomes[i] = (
+                    "not made: the reservation could not be written, make it again"
+                )
+    except Exception as e:
+        # Otherwise the booked persons would leak and every retry of the
+        # agent would be answered that the batch is still being made.
+        _roll_back_batch(reservation_items.values())
+        _release_batch_claim(request_key)
+        if isinstance(e, DeadlineExceeded):
+            return (
+                "The reservations were not made because they took too long, "
+                "make them again."
+            )
+        raise
+
+    lines = [
+        "item|restaurant_name|reservation_date|reservation_time|number_of_persons|outcome"
+    ]
+    for i, ((reservation, _), outcome) in enumerate(zip(validated, outcomes)):
+        if reservation is None:
+            requested = reservations[i]
+            lines.append(
+                f"{i + 1}|{requested.get('restaurant_name', '')}|"
+                f"{requested.get('reservation_date', '')}|"
+                f"{requested.get('reservation_time', '')}|"
+                f"{requested.get('number_of_persons', '')}|{outcome}"
+            )
+        else:
+            lines.append(
+                f"{i + 1}|{reservation['restaurant_name']}|"
+                f"{reservation['slot'].reservation_date}|"
+                f"{reservation['slot'].reservation_time}|"
+                f"{reservation['number_of_persons']}|{outcome}"
+            )
+    lines.append(
+        f"{sum(o.startswith('made') for o in outcomes)} of {len(outcomes)} "
+        "reservations were made."
+    )
+    response_body = "\n".join(lines)
+
+    _complete_batch(request_key, response_body)
+
+    return response_body
+
+
+def _list_reservations(event):
+    main_guest_name = _get_parameter(event, "main_guest_name")
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    # The reservation ids start with the date, past reservations are skipped
+    reservations = []
+    query_kwargs = {
+        "TableName": DYNAMODB_TABLE_NAME,
+        "IndexName": GUEST_INDEX_NAME,
+        "KeyConditionExpression": "guest_key = :guest_key AND reservation_id >= :today",
+        "ExpressionAttributeValues": {
+            ":guest_key": {"S": normalize_guest_name(main_guest_name)},
+            ":today": {"S": today},
         },
+        "Limit": MAX_LISTED_RESERVATIONS,
+    }
+    while len(reservations) < MAX_LISTED_RESERVATIONS:
+        response = dynamodb_client.query(**query_kwargs)
+        reservations.extend(response["Items"])
+
+        if "LastEvaluatedKey" not in response:
+            break
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    if not reservations:
+        return f"There are no upcoming reservations for {main_guest_name}."
+
+    lines = [
+        "reservation_id|restaurant_name|reservation_date|reservation_time|number_of_persons"
+    ]
+    for r in reservations[:MAX_LISTED_RESERVATIONS]:
+        lines.append(
+            f"{r['reservation_id']['S']}|{r['restaurant_name']['S']}|"
+            f"{r['reservation_date']['S']}|{r['reservation_time']['S']}|"
+            f"{r['number_of_persons']['N']}"
+        )
+
+    return "\n".join(lines)
+
+
+def _cancel_reservation(event):
+    restaurant_name = _get_parameter(event, "restaurant_name")
+    cancelled_reservation_id = _get_parameter(event, "reservation_id").strip()
+    main_guest_name = _get_parameter(event, "main_guest_name")
+
+    restaurant_metadata, unknown_message = _resolve_restaurant(restaurant_name)
+    if restaurant_metadata is None:
+        return unknown_message
+    restaurant_name = restaurant_metadata["restaurant_name"]
+
+    not_found_message = (
+        f"There is no reservation {cancelled_reservation_id} for {main_guest_name} "
+        f"at {restaurant_name}, it may have been cancelled already. "
+        "Use list_reservations to find the reservations of the guest."
     )
 
+    # DynamoDB rejects an empty key, a malformed id cannot exist anyway
+    try:
+        slot = parse_reservation_id(cancelled_reservation_id)
+    except ValueError:
+        return not_found_message
+
+    key = {
+        "restaurant_name": {"S": restaurant_name},
+        "reservation_id": {"S": cancelled_reservation_id},
+    }
+    reservation = dynamodb_client.get_item(
+        TableName=DYNAMODB_TABLE_NAME, Key=key, ConsistentRead=True
+    ).get("Item")
+    guest_key = normalize_guest_name(main_guest_name)
+    if reservation is None or reservation["guest_key"]["S"] != guest_key:
+        return not_found_message
+
+    number_of_persons = reservation["number_of_persons"]["N"]
+
+    try:
+        # The condition makes sure the persons are released only once
+        dynamodb_client.transact_write_items(
+            TransactItems=[
+                {
+                    "Delete": {
+                        "TableName": DYNAMODB_TABLE_NAME,
+                        "Key": key,
+                        "ConditionExpression": (
+                            "attribute_exists(reservation_id) AND guest_key = :guest_key"
+                        ),
+                        "ExpressionAttributeValues": {":guest_key": {"S": guest_key}},
+                    }
+                },
+                {
+                    "Update": {
+                        "TableName": BOOKED_CAPACITY_DYNAMODB_TABLE_NAME,
+                        "Key": {
+                            "restaurant_name": {"S": restaurant_name},
+                            "slot": {"S": slot.key},
+                        },
+                        "UpdateExpression": (
+                            "ADD booked_persons :persons, reservation_count :minus_one"
+                        ),
+                        "ExpressionAttributeValues": {
+                            ":persons": {"N": f"-{number_of_persons}"},
+                            ":minus_one": {"N": "-1"},
+                        },
+                    }
+                },
+            ]
+            # Otherwise making the same reservation again would return the
+            # response of the cancelled one without writing anything.
+            + (
+                [
+                    {
+                        "Delete": {
+                            "TableName": IDEMPOTENCY_DYNAMODB_TABLE_NAME,
+                            "Key": {"idempotency_key": reservation["idempotency_key"]},
+                        }
+                    }
+                ]
+                if "idempotency_key" in reservation
+                else []
+            )
+        )
+    except dynamodb_client.exceptions.TransactionCanceledException as e:
+        print(f"Cancellation failed: {e}")
+        return not_found_message
+
+    return (
+        f"Reservation {cancelled_reservation_id} at {restaurant_name} "
+        f"{slot.describe()} for {number_of_persons} persons was cancelled."
+    )
+
+
+def main(event, context):
+
+    print(json.dumps(event, indent=4))
+
+    if event["function"] == "list_reservations":
+        response = _list_reservations(event)
+    elif event["function"] == "cancel_reservation":
+        response = _cancel_reservation(event)
+    elif event["function"] == "make_reservations_batch":
+        response = _make_reservations_batch(event, context)
+    else:
+        response = _make_reservation(event, context)
+
     return {
         "messageVersion": "1.0",
         "response": {
             "actionGroup": event["actionGroup"],
             "function": event["function"],
-            "functionResponse": {
-                "responseBody": {"TEXT": {"body": "Reservation was made successfully"}}
-            },
+            "functionResponse": {"responseBody": {"TEXT": {"body": response}}},
         },
         "sessionAttributes": event["sessionAttributes"],
         "promptSessionAttributes": event["promptSessionAttributes"],
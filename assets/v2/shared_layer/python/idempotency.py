@@ -0,0 +1,31 @@
+import json
+import time
+import hashlib
+
+# Long enough to cover the retries of the agent within a session
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+def idempotency_key(session_id, function, parameters):
+    """
+    Deterministic key of an agent request. The same function called again
+    with the same parameters in the same session gets the same key.
+    """
+    payload = json.dumps(
+        {
+            "session_id": session_id,
+            "function": function,
+            "parameters": parameters,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def expires_at(ttl_seconds=DEFAULT_TTL_SECONDS):
+    """
+    Epoch seconds used as the DynamoDB TTL attribute.
+    """
+    return int(time.time()) + ttl_seconds
@@ -0,0 +1,96 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+LoadedMetadata = namedtuple("LoadedMetadata", ["version", "index"])
+
+# Key suffix of the SQLite snapshot written by the data generator
+METADATA_SNAPSHOT_SUFFIX = ".sqlite"
+
+
+def read_restaurants_metadata(key, content):
+    """
+    Returns the restaurant metadata records from either the JSON file or
+    the prebuilt SQLite snapshot, depending on the S3 key.
+    """
+    if not key.endswith(METADATA_SNAPSHOT_SUFFIX):
+        return json.loads(content.decode("utf-8"))
+
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.deserialize(content)
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute("SELECT * FROM restaurants").fetchall()
+    finally:
+        connection.close()
+
+    # The snapshot stores the dishes as a comma separated list
+    return [
+        {**dict(row), "dishes": row["dishes"].split(", ") if row["dishes"] else []}
+        for row in rows
+    ]
+
+
+class S3MetadataLoader:
+    """
+    Keeps an in-memory index built from an S3 object up to date in a warm lambda.
+
+    The object is checked with a conditional GET (If-None-Match) at most once
+    per refresh interval. When it has changed the index is rebuilt and swapped
+    in as a whole, so callers always get a consistent version and index.
+    """
+
+    def __init__(self, bucket, key, build_index, refresh_interval_seconds):
+        self.bucket = bucket
+        self.key = key
+        self.build_index = build_index
+        self.refresh_interval_seconds = refresh_interval_seconds
+
+        self._s3_client = boto3.client("s3")
+        self._lock = threading.Lock()
+        self._next_check = 0
+        self._current = None
+
+        # Load eagerly so that the work happens during the cold start
+        self._refresh()
+
+    def get(self):
+        """
+        Returns the current LoadedMetadata, refreshing it first if it is due.
+        """
+        if time.monotonic() >= self._next_check:
+            with self._lock:
+                if time.monotonic() >= self._next_check:
+                    self._refresh()
+
+        return self._current
+
+    def _refresh(self):
+        kwargs = {"IfNoneMatch": self._current.version} if self._current else {}
+
+        try:
+            response = self._s3_client.get_object(
+                Bucket=self.bucket, Key=self.key, **kwargs
+            )
+            index = self.build_index(response["Body"].read())
+        except Exception as e:
+            if isinstance(e, ClientError) and e.response["Error"]["Code"] in (
+                "304",
+                "NotModified",
+            ):
+                return
+            if self._current is None:
+                raise
+            # Keep serving the data we have until the next check
+            print(f"Failed to refresh s3://{self.bucket}/{self.key}: {e}")
+            return
+        finally:
+            self._next_check = time.monotonic() + self.refresh_interval_seconds
+
+        self._current = LoadedMetadata(version=response["ETag"], index=index)
+        print(f"Loaded s3://{self.bucket}/{self.key} version {response['ETag']}")
@@ -0,0 +1,179 @@
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone
+
+DATE_FORMAT = "%Y-%m-%d"
+TIME_FORMAT = "%H:%M"
+
+# Separates the parts of the sort keys, dates and times sort as strings
+KEY_SEPARATOR = "#"
+
+# Random part of the reservation id, unique within a restaurant and slot
+RESERVATION_ID_SUFFIX_LENGTH = 12
+
+
+class InvalidSlot(ValueError):
+    """
+    The date or time of a reservation is not valid, the message is meant for the agent.
+    """
+
+
+@dataclass(frozen=True)
+class SlotSettings:
+    """
+    Reservations are made for time slots of a fixed length from opening to closing
+    time. The capacity of a restaurant is the number of persons in a single slot.
+    """
+
+    slot_minutes: int = 60
+    opening_time: str = "12:00"
+    closing_time: str = "23:00"
+    max_days_ahead: int = 90
+    retention_days: int = 30
+
+    @classmethod
+    def from_environ(cls):
+        return cls(
+            slot_minutes=int(os.environ.get("TIME_SLOT_MINUTES", cls.slot_minutes)),
+            opening_time=os.environ.get("OPENING_TIME", cls.opening_time),
+            closing_time=os.environ.get("CLOSING_TIME", cls.closing_time),
+            max_days_ahead=int(
+                os.environ.get("MAX_RESERVATION_DAYS_AHEAD", cls.max_days_ahead)
+            ),
+            retention_days=int(
+                os.environ.get("RESERVATION_RETENTION_DAYS", cls.retention_days)
+            ),
+        )
+
+    def slot_starts(self):
+        opening = _minutes(_parse_time(self.opening_time))
+        closing = _minutes(_parse_time(self.closing_time))
+        return [
+            _format_minutes(minutes)
+            for minutes in range(
+                opening, closing - self.slot_minutes + 1, self.slot_minutes
+            )
+        ]
+
+
+@dataclass(frozen=True)
+class ReservationSlot:
+    reservation_date: str
+    reservation_time: str
+
+    @property
+    def key(self):
+        """
+        Sort key of the slot in the booked capacity table.
+        """
+        return f"{self.reservation_date}{KEY_SEPARATOR}{self.reservation_time}"
+
+    @property
+    def key_prefix(self):
+        """
+        Prefix of the sort keys of all reservations in the slot.
+        """
+        return f"{self.key}{KEY_SEPARATOR}"
+
+    def describe(self):
+        return f"on {self.reservation_date} at {self.reservation_time}"
+
+    def expires_at(self, retention_days):
+        """
+        Epoch seconds used as the DynamoDB TTL attribute of the reservations
+        and the booked capacity of the slot, the end of the day of the slot
+        plus the retention days.
+        """
+        expiry_date = datetime.strptime(
+            self.reservation_date, DATE_FORMAT
+        ).date() + timedelta(days=retention_days + 1)
+
+        return int(
+            datetime.combine(expiry_date, time(0, 0), tzinfo=timezone.utc).timestamp()
+        )
+
+
+def _parse_time(value):
+    return datetime.strptime(value, TIME_FORMAT).time()
+
+
+def _minutes(value: time):
+    return value.hour * 60 + value.minute
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60:02}:{minutes % 60:02}"
+
+
+def parse_slot(reservation_date, reservation_time, settings, today=None):
+    """
+    Validates the date and time given by the agent and returns the slot
+    that contains the time.
+    """
+    today = today or datetime.now(timezone.utc).date()
+
+    try:
+        parsed_date = datetime.strptime(reservation_date.strip(), DATE_FORMAT).date()
+    except ValueError:
+        raise InvalidSlot(
+            f"The date '{reservation_date}' is not valid, use the format YYYY-MM-DD."
+        )
+
+    try:
+        parsed_time = _parse_time(reservation_time.strip())
+    except ValueError:
+        raise InvalidSlot(
+            f"The time '{reservation_time}' is not valid, use the format HH:MM."
+        )
+
+    last_date = today + timedelta(days=settings.max_days_ahead)
+    if not today <= parsed_date <= last_date:
+        raise InvalidSlot(
+            f"Reservations can only be made from today ({today.strftime(DATE_FORMAT)}) "
+            f"to {last_date.strftime(DATE_FORMAT)}."
+        )
+
+    opening = _minutes(_parse_time(settings.opening_time))
+    slot_index = (_minutes(parsed_time) - opening) // settings.slot_minutes
+    slot_starts = settings.slot_starts()
+    if not 0 <= slot_index < len(slot_starts):
+        raise InvalidSlot(
+            f"Restaurants are open from {settings.opening_time} to "
+            f"{settings.closing_time}, the reservation slots start at "
+            f"{', '.join(slot_starts)}."
+        )
+
+    return ReservationSlot(
+        reservation_date=parsed_date.strftime(DATE_FORMAT),
+        reservation_time=slot_starts[slot_index],
+    )
+
+
+def reservation_id(slot: ReservationSlot):
+    """
+    Unique sort key of a new reservation. It starts with the slot, so that
+    the reservations of a slot can be read with a range query.
+    """
+    return f"{slot.key_prefix}{uuid.uuid4().hex[:RESERVATION_ID_SUFFIX_LENGTH]}"
+
+
+def normalize_guest_name(main_guest_name):
+    """
+    Key of the guest index, the agent may spell the name with different
+    case or whitespace.
+    """
+    return " ".join(main_guest_name.split()).casefold()
+
+
+def parse_reservation_id(value):
+    """
+    Returns the date and time of the slot of a reservation,
+    raises ValueError when the value is not a reservation id.
+    """
+    reservation_date, reservation_time, suffix = value.split(KEY_SEPARATOR, 2)
+    datetime.strptime(reservation_date, DATE_FORMAT)
+    datetime.strptime(reservation_time, TIME_FORMAT)
+    if not suffix:
+        raise ValueError(f"{value} is not a reservation id")
+    return ReservationSlot(reservation_date, reservation_time)
@@ -0,0 +1,111 @@
+import re
+from collections import Counter, defaultdict
+
+# Same default as the pg_trgm similarity threshold
+DEFAULT_SIMILARITY_THRESHOLD = 0.3
+DEFAULT_MAX_CANDIDATES = 3
+
+_NOT_ALPHANUMERIC_PATTERN = re.compile(r"[\W_]+")
+
+
+def normalize_restaurant_name(restaurant_name):
+    """
+    Case, whitespace and punctuation insensitive form of a restaurant name,
+    e.g. 'Naples Express' and 'naples-express' both become 'naplesexpress'.
+    """
+    return _NOT_ALPHANUMERIC_PATTERN.sub("", restaurant_name.casefold())
+
+
+def _trigrams(normalized_name):
+    # Padded like pg_trgm, so that the start and end of the name weigh more
+    padded = f"  {normalized_name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class RestaurantNameIndex:
+    """
+    Looks up restaurant metadata by name, built once when the metadata is loaded.
+
+    Exact names are found with a dict lookup, then names that only differ in
+    case, whitespace or punctuation. Misspelled names are not resolved,
+    instead suggest() returns the most similar names based on trigrams.
+    """
+
+    def __init__(self, metadata_json):
+        self._by_name = {m["restaurant_name"]: m for m in metadata_json}
+
+        self._by_normalized_name = defaultdict(list)
+        self._trigrams_by_name = {}
+        self._names_by_trigram = defaultdict(set)
+        for restaurant_name in self._by_name.keys():
+            normalized_name = normalize_restaurant_name(restaurant_name)
+            self._by_normalized_name[normalized_name].append(restaurant_name)
+
+            trigrams = _trigrams(normalized_name)
+            self._trigrams_by_name[restaurant_name] = trigrams
+            for trigram in trigrams:
+                self._names_by_trigram[trigram].add(restaurant_name)
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def get(self, restaurant_name):
+        """
+        Returns the metadata of the restaurant, or None if the name is unknown
+        or matches more than one restaurant after normalization.
+        """
+        metadata = self._by_name.get(restaurant_name)
+        if metadata is not None:
+            return metadata
+
+        matches = self._by_normalized_name.get(
+            normalize_restaurant_name(restaurant_name), []
+        )
+        if len(matches) == 1:
+            return self._by_name[matches[0]]
+
+        return None
+
+    def suggest(
+        self,
+        restaurant_name,
+        max_candidates=DEFAULT_MAX_CANDIDATES,
+        similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD,
+    ):
+        """
+        Returns the names of the most similar restaurants, best match first.
+        """
+        trigrams = _trigrams(normalize_restaurant_name(restaurant_name))
+
+        # Only names that share at least one trigram can be similar
+        shared_trigrams = Counter(
+            name
+            for trigram in trigrams
+            for name in self._names_by_trigram.get(trigram, ())
+        )
+
+        scored = []
+        for name, shared in shared_trigrams.items():
+            union = len(trigrams) + len(self._trigrams_by_name[name]) - shared
+            similarity = shared / union
+            if similarity >= similarity_threshold:
+                scored.append((-similarity, name))
+
+        return [name for _, name in sorted(scored)[:max_candidates]]
+
+
+def unknown_restaurant_message(restaurant_name, candidates):
+    """
+    Response for the agent when a restaurant name cannot be resolved.
+    """
+    if not candidates:
+        return (
+            f"There is no restaurant named '{restaurant_name}'. "
+            "Use find_restaurants to look up the exact name of the restaurant."
+        )
+
+    return (
+        f"There is no restaurant named '{restaurant_name}'. "
+        f"Did you mean one of these: {', '.join(candidates)}? "
+        "Confirm the restaurant with the user before trying again."
+    )
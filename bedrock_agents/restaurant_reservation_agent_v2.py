@@ -9,21 +9,23 @@ from aws_cdk import (
     aws_s3_deployment as s3_deploy,
     aws_opensearchserverless as aoss,
     aws_lambda as _lambda,
+    aws_lambda_event_sources as lambda_event_sources,
     aws_dynamodb as dynamodb,
-    triggers,
     custom_resources as cr,
 )
 from constructs import Construct
 
+from bedrock_agents.vector_index import VectorIndexProps
+
 
 RESTAURANT_METADATA_COLUMNS = [
-    "district_name"
-    "restaurant_name"
-    "restaurant_cuisine"
-    "signature_dish"
-    "dishes"
-    "average_price_per_person"
-    "rating_food_stars"
+    "district_name",
+    "restaurant_name",
+    "restaurant_cuisine",
+    "signature_dish",
+    "dishes",
+    "average_price_per_person",
+    "rating_food_stars",
     "rating_service_stars",
     "capacity_persons",
 ]
@@ -33,14 +35,32 @@ QUOTED_RESTAURANT_METADATA_COLUMNS = list(
     map(lambda x: f"'{x}'", RESTAURANT_METADATA_COLUMNS)
 )
 
+# How the metadata query lambda loads the metadata into its SQL engine.
+# "pandas" goes through a DataFrame, "stdlib" needs no extra packages
+# which makes the cold start faster and the package smaller.
+METADATA_QUERY_ENGINE_MODES = ["pandas", "stdlib"]
+
 
 class RestaurantReservationAgentV2Stack(Stack):
 
     def __init__(
-        self, scope: Construct, construct_id: str, prefix: str, **kwargs
+        self,
+        scope: Construct,
+        construct_id: str,
+        prefix: str,
+        metadata_query_engine_mode: str = "pandas",
+        use_metadata_snapshot: bool = True,
+        archive_expired_reservations: bool = True,
+        vector_index_props: VectorIndexProps = VectorIndexProps(),
+        **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        if metadata_query_engine_mode not in METADATA_QUERY_ENGINE_MODES:
+            raise ValueError(
+                f"metadata_query_engine_mode must be one of {METADATA_QUERY_ENGINE_MODES}"
+            )
+
         # agent_foundation_model_id = "amazon.nova-micro-v1:0"
         # agent_foundation_model_id = "amazon.nova-lite-v1:0"
         agent_foundation_model_id = "amazon.nova-pro-v1:0"
@@ -182,22 +202,25 @@ class RestaurantReservationAgentV2Stack(Stack):
         open_search_collection.add_dependency(open_search_encryption_security_policy)
         open_search_collection.add_dependency(open_search_network_security_policy)
 
-        vector_index_name = "restaurant-descriptions-vector-index"
+        # The knowledge base retrieves through the alias, the index behind it
+        # is versioned so that it can be rebuilt without retrieval downtime.
+        vector_index_alias_name = "restaurant-descriptions"
+        vector_index_name_prefix = "restaurant-descriptions-vector-index"
 
         vector_index_metadata_field = "AMAZON_BEDROCK_METADATA"
         vector_index_text_field = "AMAZON_BEDROCK_TEXT"
         vector_index_vector_field = "VECTOR_FIELD"
 
-        trigger_function_runtime = _lambda.Runtime.PYTHON_3_12
-        create_index_trigger_function = triggers.TriggerFunction(
+        vector_index_function_runtime = _lambda.Runtime.PYTHON_3_12
+        vector_index_function = _lambda.Function(
             self,
-            "trigger-create-vector-index-lambda",
-            runtime=trigger_function_runtime,
+            "vector-index-lambda",
+            runtime=vector_index_function_runtime,
             code=_lambda.Code.from_asset(
                 "./assets/create_aoss_index_lambda/",
                 bundling=aws_cdk.BundlingOptions(
                     # NOTE: for this to work an extra step of logging into public ECR is required
-                    image=trigger_function_runtime.bundling_image,
+                    image=vector_index_function_runtime.bundling_image,
                     command=[
                         "bash",
                         "-c",
@@ -205,19 +228,13 @@ class RestaurantReservationAgentV2Stack(Stack):
                     ],
                 ),
             ),
-            handler="handler.main",
-            timeout=Duration.seconds(180),
+            handler="provider.on_event",
+            description="Lambda function managing the versions of the vector index",
+            # Copying the documents to a new version of the index takes a while
+            timeout=Duration.minutes(10),
             environment={
                 "COLLECTION_ENDPOINT": open_search_collection.attr_collection_endpoint,
-                "VECTOR_INDEX_NAME": vector_index_name,
-                "METADATA_FIELD": vector_index_metadata_field,
-                "TEXT_FIELD": vector_index_text_field,
-                "VECTOR_FIELD": vector_index_vector_field,
-                "VECTOR_DIMENSION": str(
-                    knowledge_base_foundation_model_vector_dimension
-                ),
             },
-            execute_after=[open_search_collection],
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
@@ -229,6 +246,12 @@ class RestaurantReservationAgentV2Stack(Stack):
             ],
         )
 
+        vector_index_provider = cr.Provider(
+            self,
+            "vector-index-provider",
+            on_event_handler=vector_index_function,
+        )
+
         open_search_access_policy = aoss.CfnAccessPolicy(
             self,
             "open-search-access-policy",
@@ -264,7 +287,7 @@ class RestaurantReservationAgentV2Stack(Stack):
                         ],
                         "Principal": [
                             knowledge_base_role.role_arn,
-                            create_index_trigger_function.role.role_arn,
+                            vector_index_function.role.role_arn,
                             f"arn:aws:iam::{Aws.ACCOUNT_ID}:user/panos",
                         ],
                         "Description": "data-access-rule",
@@ -273,7 +296,30 @@ class RestaurantReservationAgentV2Stack(Stack):
                 indent=2,
             ),
         )
-        create_index_trigger_function.execute_after(open_search_access_policy)
+
+        # A changed definition creates a new version of the index, the documents
+        # are copied to it before the alias is moved and the old version deleted.
+        vector_index = aws_cdk.CustomResource(
+            self,
+            "vector-index",
+            service_token=vector_index_provider.service_token,
+            properties={
+                "AliasName": vector_index_alias_name,
+                "IndexNamePrefix": vector_index_name_prefix,
+                "Dimension": str(knowledge_base_foundation_model_vector_dimension),
+                "MetadataField": vector_index_metadata_field,
+                "TextField": vector_index_text_field,
+                "VectorField": vector_index_vector_field,
+                "Engine": vector_index_props.engine,
+                "SpaceType": vector_index_props.space_type,
+                "M": str(vector_index_props.m),
+                "EfConstruction": str(vector_index_props.ef_construction),
+                "EfSearch": str(vector_index_props.ef_search),
+                "Compression": vector_index_props.compression,
+            },
+        )
+        vector_index.node.add_dependency(open_search_collection)
+        vector_index.node.add_dependency(open_search_access_policy)
 
         # Define the knowledge base
         restaurant_descriptions_knowledge_base = bedrock.CfnKnowledgeBase(
@@ -296,14 +342,12 @@ class RestaurantReservationAgentV2Stack(Stack):
                         text_field=vector_index_text_field,
                         vector_field=vector_index_vector_field,
                     ),
-                    vector_index_name=vector_index_name,
+                    vector_index_name=vector_index_alias_name,
                 ),
             ),
         )
         restaurant_descriptions_knowledge_base.add_dependency(open_search_collection)
-        create_index_trigger_function.execute_before(
-            restaurant_descriptions_knowledge_base
-        )
+        restaurant_descriptions_knowledge_base.node.add_dependency(vector_index)
 
         restaurant_descriptions_data_source = bedrock.CfnDataSource(
             self,
@@ -368,15 +412,68 @@ class RestaurantReservationAgentV2Stack(Stack):
 
         # Create DynamoDB table for reservations
 
+        reservations_guest_index_name = "guest-index"
+
         reservations_table = dynamodb.TableV2(
             self,
             f"{prefix}-reservations",
             partition_key=dynamodb.Attribute(
                 name="restaurant_name", type=dynamodb.AttributeType.STRING
             ),
+            # The date and time slot followed by a random id,
+            # so that the reservations of a slot are a range of the partition.
             sort_key=dynamodb.Attribute(
-                name="main_guest_name", type=dynamodb.AttributeType.STRING
+                name="reservation_id", type=dynamodb.AttributeType.STRING
+            ),
+            # Finds the reservations of a guest by the normalized guest name
+            global_secondary_indexes=[
+                dynamodb.GlobalSecondaryIndexPropsV2(
+                    index_name=reservations_guest_index_name,
+                    partition_key=dynamodb.Attribute(
+                        name="guest_key", type=dynamodb.AttributeType.STRING
+                    ),
+                    sort_key=dynamodb.Attribute(
+                        name="reservation_id", type=dynamodb.AttributeType.STRING
+                    ),
+                )
+            ],
+            # Past reservations are removed by TTL and, if enabled,
+            # archived to S3 from the stream of the removed items.
+            time_to_live_attribute="expires_at",
+            dynamo_stream=(
+                dynamodb.StreamViewType.OLD_IMAGE
+                if archive_expired_reservations
+                else None
+            ),
+            removal_policy=aws_cdk.RemovalPolicy.DESTROY,
+        )
+
+        # Create DynamoDB table with the booked persons per restaurant and
+        # time slot, so that availability is answered without reading all reservations.
+
+        booked_capacity_table = dynamodb.TableV2(
+            self,
+            f"{prefix}-booked-capacity",
+            partition_key=dynamodb.Attribute(
+                name="restaurant_name", type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="slot", type=dynamodb.AttributeType.STRING
+            ),
+            time_to_live_attribute="expires_at",
+            removal_policy=aws_cdk.RemovalPolicy.DESTROY,
+        )
+
+        # Create DynamoDB table with the completed reservation requests,
+        # so that retried requests of the agent are not applied twice.
+
+        idempotency_table = dynamodb.TableV2(
+            self,
+            f"{prefix}-idempotency",
+            partition_key=dynamodb.Attribute(
+                name="idempotency_key", type=dynamodb.AttributeType.STRING
             ),
+            time_to_live_attribute="expires_at",
             removal_policy=aws_cdk.RemovalPolicy.DESTROY,
         )
 
@@ -391,6 +488,36 @@ class RestaurantReservationAgentV2Stack(Stack):
             removal_policy=aws_cdk.RemovalPolicy.DESTROY,
         )
 
+        # Define the layer with the code shared by the lambda functions
+
+        shared_layer = _lambda.LayerVersion(
+            self,
+            "shared-layer",
+            code=_lambda.Code.from_asset("./assets/v2/shared_layer/"),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],
+            description="Code shared by the lambda functions of the agent",
+        )
+
+        # How often warm lambda functions check if the metadata in S3 has changed
+        metadata_refresh_seconds = 60
+
+        # Reservations are made for time slots within the opening hours
+        reservation_slot_environment = {
+            "TIME_SLOT_MINUTES": "60",
+            "OPENING_TIME": "12:00",
+            "CLOSING_TIME": "23:00",
+            "MAX_RESERVATION_DAYS_AHEAD": "90",
+            # Days after the day of the slot when the reservations expire
+            "RESERVATION_RETENTION_DAYS": "30",
+        }
+
+        # The prebuilt SQLite snapshot is opened directly by the lambdas,
+        # the JSON has to be parsed and indexed on every cold start.
+        if use_metadata_snapshot:
+            metadata_s3_key = "restaurants-v2/restaurant-metadata.sqlite"
+        else:
+            metadata_s3_key = "restaurants-v2/restaurant-metadata.json"
+
         # Define the IAM role for the reservations lambda function
 
         reservations_lambda_role = iam.Role(
@@ -420,7 +547,22 @@ class RestaurantReservationAgentV2Stack(Stack):
                     "dynamodb:Query",
                     "dynamodb:UpdateItem",
                 ],
-                resources=[reservations_table.table_arn],
+                resources=[
+                    reservations_table.table_arn,
+                    f"{reservations_table.table_arn}/index/*",
+                    booked_capacity_table.table_arn,
+                    idempotency_table.table_arn,
+                ],
+            )
+        )
+
+        reservations_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:GetObject"],
+                resources=[
+                    s3_bucket.arn_for_objects("restaurants-v2/*"),
+                ],
             )
         )
 
@@ -434,9 +576,91 @@ class RestaurantReservationAgentV2Stack(Stack):
             code=_lambda.Code.from_asset("./assets/v2/reservations_lambda/"),
             role=reservations_lambda_role,
             description="Lambda function for Bedrock Agent Actions related to reservations",
-            environment={"DYNAMODB_TABLE_NAME": reservations_table.table_name},
+            layers=[shared_layer],
+            timeout=Duration.seconds(30),
+            environment={
+                "DYNAMODB_TABLE_NAME": reservations_table.table_name,
+                "GUEST_INDEX_NAME": reservations_guest_index_name,
+                "BOOKED_CAPACITY_DYNAMODB_TABLE_NAME": booked_capacity_table.table_name,
+                "IDEMPOTENCY_DYNAMODB_TABLE_NAME": idempotency_table.table_name,
+                "IDEMPOTENCY_TTL_SECONDS": str(24 * 60 * 60),
+                "METADATA_S3_BUCKET": s3_bucket.bucket_name,
+                "METADATA_S3_KEY": metadata_s3_key,
+                "METADATA_REFRESH_SECONDS": str(metadata_refresh_seconds),
+                **reservation_slot_environment,
+            },
         )
 
+        if archive_expired_reservations:
+            # Define the lambda function that archives the expired reservations
+
+            reservations_archive_s3_prefix = "reservations-archive/"
+
+            reservations_archive_lambda_role = iam.Role(
+                self,
+                "reservations-archive-lambda-role",
+                role_name=f"{prefix}-reservations-archive-lambda-role",
+                assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+                managed_policies=[
+                    iam.ManagedPolicy.from_aws_managed_policy_name(
+                        "service-role/AWSLambdaBasicExecutionRole"
+                    )
+                ],
+            )
+
+            reservations_archive_lambda_role.add_to_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["s3:PutObject"],
+                    resources=[
+                        s3_bucket.arn_for_objects(f"{reservations_archive_s3_prefix}*"),
+                    ],
+                )
+            )
+
+            reservations_archive_lambda = _lambda.Function(
+                self,
+                "reservations-archive-lambda",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="handler.main",
+                code=_lambda.Code.from_asset(
+                    "./assets/v2/reservations_archive_lambda/"
+                ),
+                role=reservations_archive_lambda_role,
+                description="Lambda function archiving the reservations expired by TTL to S3",
+                timeout=Duration.minutes(1),
+                environment={
+                    "ARCHIVE_S3_BUCKET": s3_bucket.bucket_name,
+                    "ARCHIVE_S3_PREFIX": reservations_archive_s3_prefix,
+                },
+            )
+
+            # Only the deletions made by TTL are archived, not the cancellations.
+            # They are batched, so that the archive has few and larger objects.
+            reservations_archive_lambda.add_event_source(
+                lambda_event_sources.DynamoEventSource(
+                    reservations_table,
+                    starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+                    batch_size=1000,
+                    max_batching_window=Duration.minutes(5),
+                    retry_attempts=10,
+                    bisect_batch_on_error=True,
+                    filters=[
+                        _lambda.FilterCriteria.filter(
+                            {
+                                "eventName": _lambda.FilterRule.is_equal("REMOVE"),
+                                "userIdentity": {
+                                    "type": _lambda.FilterRule.is_equal("Service"),
+                                    "principalId": _lambda.FilterRule.is_equal(
+                                        "dynamodb.amazonaws.com"
+                                    ),
+                                },
+                            }
+                        )
+                    ],
+                )
+            )
+
         # Define the IAM role for the availability lambda function
 
         availability_lambda_role = iam.Role(
@@ -458,10 +682,8 @@ class RestaurantReservationAgentV2Stack(Stack):
                     "dynamodb:BatchGetItem",
                     "dynamodb:DescribeTable",
                     "dynamodb:GetItem",
-                    "dynamodb:Scan",
-                    "dynamodb:Query",
                 ],
-                resources=[reservations_table.table_arn],
+                resources=[booked_capacity_table.table_arn],
             )
         )
 
@@ -485,10 +707,13 @@ class RestaurantReservationAgentV2Stack(Stack):
             code=_lambda.Code.from_asset("./assets/v2/availability_lambda/"),
             role=availability_lambda_role,
             description="Lambda function for Bedrock Agent Actions related to availability",
+            layers=[shared_layer],
             environment={
-                "RESERVATIONS_DYNAMODB_TABLE_NAME": reservations_table.table_name,
+                "BOOKED_CAPACITY_DYNAMODB_TABLE_NAME": booked_capacity_table.table_name,
                 "METADATA_S3_BUCKET": s3_bucket.bucket_name,
-                "METADATA_S3_KEY": "restaurants-v2/restaurant-metadata.json",
+                "METADATA_S3_KEY": metadata_s3_key,
+                "METADATA_REFRESH_SECONDS": str(metadata_refresh_seconds),
+                **reservation_slot_environment,
             },
         )
 
@@ -537,29 +762,47 @@ class RestaurantReservationAgentV2Stack(Stack):
 
         # Define the lambda function for retrieving metadata
 
-        metadata_query_lambda = _lambda.Function(
-            self,
-            "metadata-lambda",
-            runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="handler.main",
-            code=_lambda.Code.from_asset(
+        if metadata_query_engine_mode == "pandas":
+            metadata_query_lambda_code = _lambda.Code.from_asset(
                 "./assets/v2/metadata_query_lambda/",
                 bundling=aws_cdk.BundlingOptions(
                     # NOTE: for this to work an extra step of logging into public ECR is required
-                    image=trigger_function_runtime.bundling_image,
+                    image=vector_index_function_runtime.bundling_image,
                     command=[
                         "bash",
                         "-c",
                         "pip install --no-cache -r requirements.txt -t /asset-output && cp -au . /asset-output",
                     ],
                 ),
-            ),
+            )
+        else:
+            # Only the standard library is needed, no need to bundle any packages
+            metadata_query_lambda_code = _lambda.Code.from_asset(
+                "./assets/v2/metadata_query_lambda/",
+                exclude=["requirements.txt"],
+            )
+
+        metadata_query_lambda = _lambda.Function(
+            self,
+            "metadata-lambda",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            handler="handler.main",
+            code=metadata_query_lambda_code,
             role=metadata_query_lambda_role,
             description="Lambda function for retrieving restaurant metadata with SQL query",
+            # Longer than the time limit of a query (QUERY_MAX_SECONDS), which is
+            # also lowered to the time left in the invocation
+            timeout=Duration.seconds(30),
+            # The SQLite heap of a query is limited to the memory left by the
+            # runtime, pandas and the metadata (BASELINE_MEMORY_MB)
+            memory_size=256,
+            layers=[shared_layer],
             environment={
                 "METADATA_S3_BUCKET": s3_bucket.bucket_name,
-                "METADATA_S3_KEY": "restaurants-v2/restaurant-metadata.json",
+                "METADATA_S3_KEY": metadata_s3_key,
                 "DYNAMODB_TABLE_NAME": sql_queries_table.table_name,
+                "METADATA_ENGINE_MODE": metadata_query_engine_mode,
+                "METADATA_REFRESH_SECONDS": str(metadata_refresh_seconds),
             },
         )
 
@@ -599,10 +842,27 @@ class RestaurantReservationAgentV2Stack(Stack):
         )
 
         # Define the action groups
+
+        # Every reservation and availability check is for a date and time slot
+        reservation_date_parameter = bedrock.CfnAgent.ParameterDetailProperty(
+            type="string",
+            description="the date of the reservation in the format YYYY-MM-DD",
+            required=True,
+        )
+        reservation_time_parameter = bedrock.CfnAgent.ParameterDetailProperty(
+            type="string",
+            description=(
+                f"the time of the reservation in the format HH:MM, between "
+                f"{reservation_slot_environment['OPENING_TIME']} and "
+                f"{reservation_slot_environment['CLOSING_TIME']}. Reservations are for "
+                f"slots of {reservation_slot_environment['TIME_SLOT_MINUTES']} minutes."
+            ),
+            required=True,
+        )
         check_availability_action_group = bedrock.CfnAgent.AgentActionGroupProperty(
             action_group_name="CheckRestaurantAvailability",
             description=(
-                "Check restaurant availability before making reservation. "
+                "Check restaurant availability for a date and time, e.g. to compare restaurants. "
                 "The available capacity should be greater or equal to the number of persons to reserve."
             ),
             action_group_executor=bedrock.CfnAgent.ActionGroupExecutorProperty(
@@ -618,8 +878,28 @@ class RestaurantReservationAgentV2Stack(Stack):
                                 description="the name of the restaurant to check availability for",
                                 required=True,
                             ),
+                            "reservation_date": reservation_date_parameter,
+                            "reservation_time": reservation_time_parameter,
                         },
-                    )
+                    ),
+                    bedrock.CfnAgent.FunctionProperty(
+                        name="check_availability_bulk",
+                        description=(
+                            "Check the availability of several restaurants in one call, "
+                            "e.g. all the candidates returned by find_restaurants. "
+                            "Prefer it over calling check_restaurant_availability once per restaurant. "
+                            "Returns the remaining capacity in persons of each restaurant."
+                        ),
+                        parameters={
+                            "restaurant_names": bedrock.CfnAgent.ParameterDetailProperty(
+                                type="array",
+                                description="the names of the restaurants to check availability for, at most 50",
+                                required=True,
+                            ),
+                            "reservation_date": reservation_date_parameter,
+                            "reservation_time": reservation_time_parameter,
+                        },
+                    ),
                 ]
             ),
             skip_resource_in_use_check_on_delete=True,
@@ -628,7 +908,7 @@ class RestaurantReservationAgentV2Stack(Stack):
         find_restaurants_action_group = bedrock.CfnAgent.AgentActionGroupProperty(
             action_group_name="FindRestaurants",
             description=(
-                "Find restaurants based on a SQL query. The table to query must always be 'restaurants'. "
+                "Find restaurants based on a SQL query. "
                 "Example: 'SELECT * FROM restaurants'. "
                 "Give preference to this action over searching in any knowledge base."
             ),
@@ -639,17 +919,44 @@ class RestaurantReservationAgentV2Stack(Stack):
                 functions=[
                     bedrock.CfnAgent.FunctionProperty(
                         name="find_restaurants",
+                        description=(
+                            "Find restaurants with a SQLite query. The tables are: "
+                            "'restaurants' with one row per restaurant. "
+                            "'restaurant_dishes' with columns 'restaurant_name','dish','is_signature_dish' "
+                            "and one row per dish of a restaurant, 'dish' is case insensitive. "
+                            "'restaurant_dishes_fts' is an FTS5 full-text index with columns "
+                            "'restaurant_name','dishes','signature_dish', "
+                            "e.g. WHERE restaurant_dishes_fts MATCH 'pie'. "
+                            "Use 'restaurant_dishes' or 'restaurant_dishes_fts' to find restaurants serving a dish "
+                            "and join them with 'restaurants' on 'restaurant_name'. "
+                            "Precomputed statistics are in 'district_cuisine_stats' and 'district_dish_stats' "
+                            "with columns 'restaurant_count','min_price','avg_price','max_price',"
+                            "'avg_rating_food_stars','avg_rating_service_stars','total_capacity_persons' "
+                            "per 'district_name' and 'restaurant_cuisine' or 'dish'. "
+                            "'restaurant_rankings' has the top 10 restaurants per 'district_name' and 'restaurant_cuisine' "
+                            "for each 'ranking' ('cheapest','most_expensive','best_food','best_service') "
+                            "ordered by 'rank_position'. "
+                            "In these three tables the value 'All' means all districts or all cuisines. "
+                            "Prefer them for questions about statistics and rankings."
+                        ),
                         parameters={
                             "sql_query": bedrock.CfnAgent.ParameterDetailProperty(
                                 type="string",
                                 description=(
-                                    f"A query in SQL for a relational table with columns {','.join(QUOTED_RESTAURANT_METADATA_COLUMNS)}. "
+                                    f"A query in SQL. The table 'restaurants' has columns {','.join(QUOTED_RESTAURANT_METADATA_COLUMNS)}. "
                                     "The column 'dishes' is a string containing all dishes separated by a comma (',')."
                                 ),
                                 required=True,
                             ),
                         },
-                    )
+                    ),
+                    bedrock.CfnAgent.FunctionProperty(
+                        name="next_page",
+                        description=(
+                            "Get the next page of results of the last find_restaurants query. "
+                            "Use it only when find_restaurants says that there are more results."
+                        ),
+                    ),
                 ]
             ),
             skip_resource_in_use_check_on_delete=True,
@@ -658,8 +965,8 @@ class RestaurantReservationAgentV2Stack(Stack):
         make_reservation_action_group = bedrock.CfnAgent.AgentActionGroupProperty(
             action_group_name="MakeRestaurantReservation",
             description=(
-                "Make a restaurant reservation. "
-                "Always check beforehand if there is availability for all persons."
+                "Make, list and cancel restaurant reservations. A reservation is only made if there is "
+                "availability for all persons and the response contains the remaining capacity."
             ),
             action_group_executor=bedrock.CfnAgent.ActionGroupExecutorProperty(
                 lambda_=reservations_lambda.function_arn
@@ -684,8 +991,65 @@ class RestaurantReservationAgentV2Stack(Stack):
                                 description="number of persons for the reservation. must be positive number.",
                                 required=True,
                             ),
+                            "reservation_date": reservation_date_parameter,
+                            "reservation_time": reservation_time_parameter,
                         },
-                    )
+                    ),
+                    bedrock.CfnAgent.FunctionProperty(
+                        name="make_reservations_batch",
+                        description=(
+                            "Make several reservations at once, e.g. for a group that needs tables at one "
+                            "or more restaurants. Each reservation is made only if it fits the remaining "
+                            "capacity, the response lists the outcome of every reservation."
+                        ),
+                        parameters={
+                            "reservations": bedrock.CfnAgent.ParameterDetailProperty(
+                                type="array",
+                                description=(
+                                    "JSON array of at most 25 reservations. Each reservation is an object with "
+                                    "restaurant_name, main_guest_name, number_of_persons, "
+                                    "reservation_date (YYYY-MM-DD) and reservation_time (HH:MM)."
+                                ),
+                                required=True,
+                            ),
+                        },
+                    ),
+                    bedrock.CfnAgent.FunctionProperty(
+                        name="list_reservations",
+                        description=(
+                            "List the upcoming reservations of a guest with their reservation ids."
+                        ),
+                        parameters={
+                            "main_guest_name": bedrock.CfnAgent.ParameterDetailProperty(
+                                type="string",
+                                description="the name of the person who made the reservations",
+                                required=True,
+                            ),
+                        },
+                    ),
+                    bedrock.CfnAgent.FunctionProperty(
+                        name="cancel_reservation",
+                        description=(
+                            "Cancel a reservation. Use list_reservations first if the reservation id is not known."
+                        ),
+                        parameters={
+                            "restaurant_name": bedrock.CfnAgent.ParameterDetailProperty(
+                                type="string",
+                                description="the name of the restaurant of the reservation",
+                                required=True,
+                            ),
+                            "reservation_id": bedrock.CfnAgent.ParameterDetailProperty(
+                                type="string",
+                                description="the id of the reservation to cancel",
+                                required=True,
+                            ),
+                            "main_guest_name": bedrock.CfnAgent.ParameterDetailProperty(
+                                type="string",
+                                description="the name of the person who made the reservation",
+                                required=True,
+                            ),
+                        },
+                    ),
                 ]
             ),
             skip_resource_in_use_check_on_delete=True,
@@ -745,7 +1109,9 @@ class RestaurantReservationAgentV2Stack(Stack):
             idle_session_ttl_in_seconds=600,
             instruction=(
                 "You are an agent that helps me to find the right restaurant and then make a reservation. "
-                "You check the availability of a restaurant before making a reservation."
+                "You can check the availability of restaurants before making a reservation, "
+                "a reservation is not made when there is not enough capacity. "
+                "Ask for the date and time of the reservation if they are not given."
             ),
             agent_resource_role_arn=agent_role.role_arn,
             auto_prepare=True,
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+
+# Space types supported by each engine of the OpenSearch k-NN plugin
+VECTOR_INDEX_SPACE_TYPES = {
+    "faiss": ["l2", "innerproduct"],
+    "lucene": ["l2", "cosinesimil", "innerproduct"],
+}
+
+# Scalar quantization of the vectors, each supported by one engine:
+# "fp16" halves the memory with faiss, "byte" quarters it with lucene.
+VECTOR_INDEX_COMPRESSIONS = {"none": None, "fp16": "faiss", "byte": "lucene"}
+
+
+@dataclass(frozen=True)
+class VectorIndexProps:
+    """
+    HNSW parameters of the vector index of the knowledge base. Higher m,
+    ef_construction and ef_search give a better recall for a slower build
+    and slower queries, compression trades recall for memory.
+    """
+
+    engine: str = "faiss"
+    space_type: str = "l2"
+    m: int = 16
+    ef_construction: int = 512
+    ef_search: int = 512
+    compression: str = "none"
+
+    def __post_init__(self):
+        if self.engine not in VECTOR_INDEX_SPACE_TYPES:
+            raise ValueError(
+                f"engine must be one of {list(VECTOR_INDEX_SPACE_TYPES.keys())}"
+            )
+        if self.space_type not in VECTOR_INDEX_SPACE_TYPES[self.engine]:
+            raise ValueError(
+                f"space_type of the {self.engine} engine must be one of "
+                f"{VECTOR_INDEX_SPACE_TYPES[self.engine]}"
+            )
+        if self.compression not in VECTOR_INDEX_COMPRESSIONS:
+            raise ValueError(
+                f"compression must be one of {list(VECTOR_INDEX_COMPRESSIONS.keys())}"
+            )
+        if VECTOR_INDEX_COMPRESSIONS[self.compression] not in (None, self.engine):
+            raise ValueError(
+                f"{self.compression} compression needs the "
+                f"{VECTOR_INDEX_COMPRESSIONS[self.compression]} engine"
+            )
+        if not 2 <= self.m <= 100:
+            raise ValueError("m must be between 2 and 100")
+        if self.ef_construction < self.m or self.ef_search < 1:
+            raise ValueError("ef_construction must be at least m, ef_search positive")
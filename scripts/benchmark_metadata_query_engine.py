@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+DEFAULT_METADATA_FILE = "./data/restaurants-v2/restaurant-metadata.json"
+DEFAULT_METADATA_SNAPSHOT_FILE = "./data/restaurants-v2/restaurant-metadata.sqlite"
+DEFAULT_REPEATS = 5
+METADATA_QUERY_LAMBDA_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "assets",
+    "v2",
+    "metadata_query_lambda",
+)
+ENGINE_MODES = ["pandas", "stdlib"]
+METADATA_SOURCES = ["json", "snapshot"]
+SAMPLE_QUERY = (
+    "SELECT * FROM restaurants "
+    "WHERE restaurant_cuisine = 'Greek' AND district_name = 'South District' "
+    "ORDER BY rating_food_stars DESC LIMIT 10"
+)
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cold start of the metadata query engine modes"
+    )
+
+    parser.add_argument(
+        "--metadata-file",
+        help=f"Restaurant metadata JSON file. Default value is {DEFAULT_METADATA_FILE}.",
+        type=str,
+        default=DEFAULT_METADATA_FILE,
+    )
+
+    parser.add_argument(
+        "--metadata-snapshot-file",
+        help=f"Restaurant metadata SQLite snapshot. Default value is {DEFAULT_METADATA_SNAPSHOT_FILE}.",
+        type=str,
+        default=DEFAULT_METADATA_SNAPSHOT_FILE,
+    )
+
+    parser.add_argument(
+        "--repeats",
+        help=f"Number of fresh interpreters per mode. Default value is {DEFAULT_REPEATS}.",
+        type=int,
+        default=DEFAULT_REPEATS,
+    )
+
+    # Used internally to measure a single cold start in a fresh interpreter
+    parser.add_argument("--measure-mode", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--measure-source", type=str, help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+def _measure_cold_start(mode: str, source: str, metadata_file: str):
+    start = time.perf_counter()
+
+    sys.path.insert(0, METADATA_QUERY_LAMBDA_DIRECTORY)
+    from restaurants_db import RestaurantsDatabase
+
+    if mode == "pandas":
+        import pandas  # noqa: F401
+
+    imported = time.perf_counter()
+
+    if source == "snapshot":
+        with open(metadata_file, "rb") as f:
+            database = RestaurantsDatabase.from_snapshot(f.read(), mode=mode)
+    else:
+        with open(metadata_file) as f:
+            metadata_json = json.load(f)
+        database = RestaurantsDatabase.from_metadata_json(metadata_json, mode=mode)
+
+    initialized = time.perf_counter()
+
+    records = database.query(SAMPLE_QUERY)
+    json.dumps(records)
+
+    queried = time.perf_counter()
+
+    return {
+        "import_ms": (imported - start) * 1000,
+        "init_ms": (initialized - imported) * 1000,
+        "first_query_ms": (queried - initialized) * 1000,
+    }
+
+
+def _run_in_fresh_interpreter(mode: str, source: str, metadata_file: str):
+    output = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--measure-mode",
+            mode,
+            "--measure-source",
+            source,
+            "--metadata-file",
+            metadata_file,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    return json.loads(output)
+
+
+def main():
+    args = _get_args()
+
+    if args.measure_mode:
+        print(
+            json.dumps(
+                _measure_cold_start(
+                    args.measure_mode, args.measure_source, args.metadata_file
+                )
+            )
+        )
+        return
+
+    metadata_files = {
+        "json": args.metadata_file,
+        "snapshot": args.metadata_snapshot_file,
+    }
+
+    print(
+        f"{'mode':<8} {'source':<10} {'import (ms)':>12} {'init (ms)':>12} "
+        f"{'first query (ms)':>18}"
+    )
+    for mode in ENGINE_MODES:
+        for source in METADATA_SOURCES:
+            runs = [
+                _run_in_fresh_interpreter(mode, source, metadata_files[source])
+                for _ in range(args.repeats)
+            ]
+            median = {
+                key: statistics.median(run[key] for run in runs)
+                for key in runs[0].keys()
+            }
+            print(
+                f"{mode:<8} {source:<10} {median['import_ms']:>12.1f} "
+                f"{median['init_ms']:>12.1f} {median['first_query_ms']:>18.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import itertools
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bedrock_agents.vector_index import VectorIndexProps  # noqa: E402
+from vector_search.brute_force import BruteForceIndex  # noqa: E402
+from vector_search.chunking import chunk_text  # noqa: E402
+from vector_search.embedding import HashingEmbedder  # noqa: E402
+from vector_search.hnsw import HnswIndex  # noqa: E402
+
+DEFAULT_DESCRIPTIONS_DIRECTORY = "./data/restaurants-v2/descriptions/"
+DEFAULT_METADATA_FILE = "./data/restaurants-v2/restaurant-metadata.json"
+DEFAULT_DIMENSION = 256
+DEFAULT_QUERIES = 200
+DEFAULT_K = 10
+SEED = 42
+
+QUERY_TEMPLATES = [
+    "{restaurant_cuisine} restaurant in {district_name}",
+    "Where can I eat {dish} in {district_name}?",
+    "The {dish} is delicious",
+    "{restaurant_cuisine} food with excellent {signature_dish}",
+    "Reviews of the {dish} at a {restaurant_cuisine} restaurant",
+]
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmark the recall, latency, build time and memory of HNSW vector "
+            "indexes against exact search. Runs locally with a deterministic "
+            "hashing embedder instead of the embedding model. The latencies "
+            "are of a Python index and only comparable with each other."
+        )
+    )
+
+    parser.add_argument(
+        "--descriptions-directory",
+        help=f"Restaurant descriptions. Default value is {DEFAULT_DESCRIPTIONS_DIRECTORY}.",
+        type=str,
+        default=DEFAULT_DESCRIPTIONS_DIRECTORY,
+    )
+
+    parser.add_argument(
+        "--metadata-file",
+        help=f"Restaurant metadata used to generate the queries. Default value is {DEFAULT_METADATA_FILE}.",
+        type=str,
+        default=DEFAULT_METADATA_FILE,
+    )
+
+    parser.add_argument(
+        "--max-documents",
+        help="Only index the first descriptions, to get results faster.",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--dimension",
+        help=f"Dimension of the embeddings. Default value is {DEFAULT_DIMENSION}.",
+        type=int,
+        default=DEFAULT_DIMENSION,
+    )
+
+    parser.add_argument(
+        "--queries",
+        help=f"Number of queries. Default value is {DEFAULT_QUERIES}.",
+        type=int,
+        default=DEFAULT_QUERIES,
+    )
+
+    parser.add_argument(
+        "-k",
+        help=f"Number of results of each query. Default value is {DEFAULT_K}.",
+        type=int,
+        default=DEFAULT_K,
+    )
+
+    parser.add_argument("--engine", nargs="+", default=["faiss", "lucene"])
+    parser.add_argument("--space-type", nargs="+", default=["l2"])
+    parser.add_argument("--m", nargs="+", type=int, default=[16])
+    parser.add_argument("--ef-construction", nargs="+", type=int, default=[128])
+    parser.add_argument(
+        "--ef-search",
+        help="Only used by the faiss engine, lucene searches k candidates.",
+        nargs="+",
+        type=int,
+        default=[16, 64, 256],
+    )
+    parser.add_argument("--compression", nargs="+", default=["none", "fp16", "byte"])
+
+    parser.add_argument(
+        "--output-file",
+        help="Also write the results as JSON lines to this file.",
+        type=str,
+        default=None,
+    )
+
+    return parser.parse_args()
+
+
+def _load_chunks(descriptions_directory, max_documents):
+    file_paths = sorted(glob.glob(os.path.join(descriptions_directory, "*.txt")))
+    if max_documents is not None:
+        file_paths = file_paths[:max_documents]
+
+    chunks = []
+    for file_path in file_paths:
+        with open(file_path) as f:
+            chunks.extend(chunk_text(f.read()))
+
+    return len(file_paths), chunks
+
+
+def _generate_queries(metadata_file, number_of_queries):
+    with open(metadata_file) as f:
+        metadata_json = json.load(f)
+
+    rng = random.Random(SEED)
+    queries = []
+    for _ in range(number_of_queries):
+        restaurant = rng.choice(metadata_json)
+        queries.append(
+            rng.choice(QUERY_TEMPLATES).format(
+                dish=rng.choice(restaurant["dishes"]), **restaurant
+            )
+        )
+
+    return queries
+
+
+def _parameter_grid(args):
+    """
+    The combinations of index parameters that the stack accepts, the others
+    are skipped like VectorIndexProps would reject them.
+    """
+    for engine, space_type, m, ef_construction, compression in itertools.product(
+        args.engine, args.space_type, args.m, args.ef_construction, args.compression
+    ):
+        try:
+            yield VectorIndexProps(
+                engine=engine,
+                space_type=space_type,
+                m=m,
+                ef_construction=ef_construction,
+                compression=compression,
+            )
+        except ValueError as e:
+            print(
+                f"Skipping {engine} {space_type} m={m} "
+                f"ef_construction={ef_construction} {compression}: {e}"
+            )
+
+
+def _percentile(values, percentile):
+    return statistics.quantiles(values, n=100, method="inclusive")[percentile - 1]
+
+
+def _run_queries(index, query_vectors, k, **search_kwargs):
+    results = []
+    latencies_ms = []
+    for query_vector in query_vectors:
+        start = time.perf_counter()
+        ids, _ = index.search(query_vector, k, **search_kwargs)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        results.append(set(ids.tolist()))
+
+    return results, latencies_ms
+
+
+def _latency_summary(latencies_ms):
+    return {
+        "p50_ms": _percentile(latencies_ms, 50),
+        "p90_ms": _percentile(latencies_ms, 90),
+        "p99_ms": _percentile(latencies_ms, 99),
+    }
+
+
+def _print_row(result):
+    print(
+        f"{result['index']:<8} {result['engine']:<7} {result['space_type']:<12} "
+        f"{result['compression']:<5} {result['m']:>4} {result['ef_construction']:>6} "
+        f"{result['ef_search']:>6} {result['build_s']:>8.1f} "
+        f"{result['memory_bytes'] / 1024**2:>8.2f} {result['recall_at_k']:>7.3f} "
+        f"{result['p50_ms']:>7.2f} {result['p90_ms']:>7.2f} {result['p99_ms']:>7.2f}"
+    )
+
+
+def main():
+    args = _get_args()
+
+    number_of_documents, chunks = _load_chunks(
+        args.descriptions_directory, args.max_documents
+    )
+    queries = _generate_queries(args.metadata_file, args.queries)
+
+    embedder = HashingEmbedder(dimension=args.dimension)
+    start = time.perf_counter()
+    chunk_vectors = embedder.embed(chunks)
+    query_vectors = embedder.embed(queries)
+    print(
+        f"Embedded {len(chunks)} chunks of {number_of_documents} descriptions and "
+        f"{len(queries)} queries in {time.perf_counter() - start:.1f} s, "
+        f"dimension {args.dimension}, k={args.k}"
+    )
+    print(
+        f"{'index':<8} {'engine':<7} {'space_type':<12} {'comp':<5} {'m':>4} "
+        f"{'ef_c':>6} {'ef_s':>6} {'build_s':>8} {'mem_mb':>8} {'recall':>7} "
+        f"{'p50_ms':>7} {'p90_ms':>7} {'p99_ms':>7}"
+    )
+
+    results = []
+    exact_results = {}
+    for space_type in args.space_type:
+        start = time.perf_counter()
+        exact_index = BruteForceIndex(args.dimension, space_type)
+        exact_index.add(chunk_vectors)
+        build_s = time.perf_counter() - start
+
+        exact_results[space_type], latencies_ms = _run_queries(
+            exact_index, query_vectors, args.k
+        )
+        results.append(
+            {
+                "index": "exact",
+                "engine": "-",
+                "space_type": space_type,
+                "compression": "none",
+                "m": 0,
+                "ef_construction": 0,
+                "ef_search": 0,
+                "build_s": build_s,
+                "memory_bytes": exact_index.nbytes,
+                "recall_at_k": 1.0,
+                **_latency_summary(latencies_ms),
+            }
+        )
+        _print_row(results[-1])
+
+    for props in _parameter_grid(args):
+        start = time.perf_counter()
+        index = HnswIndex(
+            args.dimension,
+            space_type=props.space_type,
+            m=props.m,
+            ef_construction=props.ef_construction,
+            compression=props.compression,
+            seed=SEED,
+        )
+        index.add(chunk_vectors)
+        build_s = time.perf_counter() - start
+
+        # Lucene searches k candidates per segment, ef_search is not used
+        ef_search_values = args.ef_search if props.engine == "faiss" else [args.k]
+        for ef_search in ef_search_values:
+            approximate_results, latencies_ms = _run_queries(
+                index, query_vectors, args.k, ef_search=ef_search
+            )
+            recall_at_k = statistics.mean(
+                len(approximate & exact) / max(len(exact), 1)
+                for approximate, exact in zip(
+                    approximate_results, exact_results[props.space_type]
+                )
+            )
+
+            results.append(
+                {
+                    "index": "hnsw",
+                    "engine": props.engine,
+                    "space_type": props.space_type,
+                    "compression": props.compression,
+                    "m": props.m,
+                    "ef_construction": props.ef_construction,
+                    "ef_search": ef_search,
+                    "build_s": build_s,
+                    "memory_bytes": index.nbytes,
+                    "recall_at_k": recall_at_k,
+                    **_latency_summary(latencies_ms),
+                }
+            )
+            _print_row(results[-1])
+
+    if args.output_file:
+        with open(args.output_file, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
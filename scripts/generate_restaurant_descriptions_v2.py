@@ -1,4 +1,5 @@
 import os
+import sys
 import argparse
 import random
 import json
@@ -6,6 +7,19 @@ from string import ascii_lowercase
 
 from typing import List, Dict
 
+# The snapshot is built with the same code that the metadata query lambda runs
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "assets",
+        "v2",
+        "metadata_query_lambda",
+    ),
+)
+from restaurants_db import RestaurantsDatabase  # noqa: E402
+
 DEFAULT_RANDOM_SEED = 123
 DEFAULT_NUMBER_OF_RESTAURANTS_TO_GENERATE = 1000
 MINIMUM_PRICE = 3
@@ -423,6 +437,13 @@ def main():
     ) as f:
         json.dump(all_metadata, f, indent=4)
 
+    # Ready to query SQLite database with all indexes and aggregates,
+    # the lambdas open it directly instead of parsing the JSON.
+    snapshot_path = os.path.join(args.output_directory, "restaurant-metadata.sqlite")
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+    RestaurantsDatabase.from_metadata_json(all_metadata).save_snapshot(snapshot_path)
+
 
 if __name__ == "__main__":
     main()
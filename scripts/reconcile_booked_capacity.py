@@ -0,0 +1,148 @@
+import os
+import sys
+import argparse
+from collections import defaultdict
+
+import boto3
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "assets",
+        "v2",
+        "shared_layer",
+        "python",
+    ),
+)
+from reservation_slots import (  # noqa: E402
+    KEY_SEPARATOR,
+    ReservationSlot,
+    SlotSettings,
+    parse_reservation_id,
+)
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Rebuild the booked capacity counters of the V2 agent from the "
+            "reservation rows. Reservations made while the script runs "
+            "may be missed, run it again when the agent is idle."
+        )
+    )
+
+    parser.add_argument(
+        "--reservations-table",
+        help="Name of the DynamoDB table with the reservations.",
+        type=str,
+        required=True,
+    )
+
+    parser.add_argument(
+        "--booked-capacity-table",
+        help="Name of the DynamoDB table with the booked capacity counters.",
+        type=str,
+        required=True,
+    )
+
+    parser.add_argument(
+        "--retention-days",
+        help=(
+            "Days after the day of the slot when the written counters expire, "
+            "the same as RESERVATION_RETENTION_DAYS of the reservations lambda."
+        ),
+        type=int,
+        default=SlotSettings.retention_days,
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        help="Only print the differences, do not update the counters.",
+        action="store_true",
+    )
+
+    return parser.parse_args()
+
+
+def _scan_all(table, **kwargs):
+    while True:
+        response = table.scan(**kwargs)
+        yield from response["Items"]
+
+        if "LastEvaluatedKey" not in response:
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _sum_reservations(reservations_table):
+    counters = defaultdict(lambda: {"booked_persons": 0, "reservation_count": 0})
+
+    for reservation in _scan_all(
+        reservations_table,
+        ProjectionExpression="restaurant_name, reservation_id, number_of_persons",
+    ):
+        slot = parse_reservation_id(reservation["reservation_id"])
+        counter = counters[(reservation["restaurant_name"], slot.key)]
+        counter["booked_persons"] += int(reservation["number_of_persons"])
+        counter["reservation_count"] += 1
+
+    return counters
+
+
+def main():
+    args = _get_args()
+
+    dynamodb_resource = boto3.resource("dynamodb")
+    reservations_table = dynamodb_resource.Table(args.reservations_table)
+    booked_capacity_table = dynamodb_resource.Table(args.booked_capacity_table)
+
+    expected_counters = _sum_reservations(reservations_table)
+    current_counters = {
+        (item["restaurant_name"], item["slot"]): {
+            "booked_persons": int(item.get("booked_persons", 0)),
+            "reservation_count": int(item.get("reservation_count", 0)),
+        }
+        for item in _scan_all(booked_capacity_table)
+    }
+
+    to_write = {
+        key: counter
+        for key, counter in expected_counters.items()
+        if current_counters.get(key) != counter
+    }
+    to_delete = [key for key in current_counters.keys() if key not in expected_counters]
+
+    for key, counter in to_write.items():
+        print(f"{' '.join(key)}: {current_counters.get(key)} -> {counter}")
+    for key in to_delete:
+        print(f"{' '.join(key)}: {current_counters[key]} -> None")
+
+    print(
+        f"{len(expected_counters)} restaurant slots with reservations, "
+        f"{len(to_write)} counters to write, {len(to_delete)} counters to delete"
+    )
+
+    if args.dry_run:
+        return
+
+    with booked_capacity_table.batch_writer() as batch:
+        for (restaurant_name, slot), counter in to_write.items():
+            expires_at = ReservationSlot(*slot.split(KEY_SEPARATOR)).expires_at(
+                args.retention_days
+            )
+            batch.put_item(
+                Item={
+                    "restaurant_name": restaurant_name,
+                    "slot": slot,
+                    **counter,
+                    "expires_at": expires_at,
+                }
+            )
+        for restaurant_name, slot in to_delete:
+            batch.delete_item(Key={"restaurant_name": restaurant_name, "slot": slot})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from vector_search.retriever import (  # noqa: E402
+    DEFAULT_NUMBER_OF_RESULTS,
+    INDEX_TYPES,
+    BedrockKnowledgeBaseRetriever,
+    LocalRetriever,
+)
+
+DEFAULT_DESCRIPTIONS_DIRECTORY = "./data/restaurants-v2/descriptions/"
+# Source uris of the local chunks, like the S3 data source of the V2 stack
+DEFAULT_S3_URI_PREFIX = "s3://local/restaurants-v2/descriptions/"
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Retrieve restaurant description chunks for a query, from a local "
+            "in memory index or from the knowledge base of the deployed stack. "
+            "Prints the response in the shape of the Bedrock Retrieve API."
+        )
+    )
+
+    parser.add_argument("query", help="The text to retrieve chunks for.", type=str)
+
+    parser.add_argument(
+        "--knowledge-base-id",
+        help="Retrieve from this Bedrock knowledge base instead of the local index.",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--index-type",
+        help="Index of the local retriever. Default value is brute_force.",
+        choices=INDEX_TYPES,
+        default="brute_force",
+    )
+
+    parser.add_argument(
+        "--descriptions-directory",
+        help=f"Restaurant descriptions. Default value is {DEFAULT_DESCRIPTIONS_DIRECTORY}.",
+        type=str,
+        default=DEFAULT_DESCRIPTIONS_DIRECTORY,
+    )
+
+    parser.add_argument(
+        "--number-of-results",
+        help=f"Number of chunks to retrieve. Default value is {DEFAULT_NUMBER_OF_RESULTS}.",
+        type=int,
+        default=DEFAULT_NUMBER_OF_RESULTS,
+    )
+
+    parser.add_argument(
+        "--repeats",
+        help="Repeat the query to measure the queries per second.",
+        type=int,
+        default=1,
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = _get_args()
+
+    if args.knowledge_base_id:
+        retriever = BedrockKnowledgeBaseRetriever(args.knowledge_base_id)
+    else:
+        start = time.perf_counter()
+        retriever = LocalRetriever.from_directory(
+            args.descriptions_directory,
+            s3_uri_prefix=DEFAULT_S3_URI_PREFIX,
+            index_type=args.index_type,
+        )
+        print(
+            f"Indexed {len(retriever)} chunks in {time.perf_counter() - start:.1f} s",
+            file=sys.stderr,
+        )
+
+    start = time.perf_counter()
+    for _ in range(args.repeats):
+        response = retriever.retrieve(args.query, args.number_of_results)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps(response, indent=4, default=str))
+    print(
+        f"{args.repeats} queries in {elapsed:.2f} s, "
+        f"{args.repeats / elapsed:.0f} queries per second",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The lambdas import their modules and the shared layer as top level modules
+for path in [
+    ROOT_DIRECTORY,
+    os.path.join(ROOT_DIRECTORY, "assets", "v2", "metadata_query_lambda"),
+    os.path.join(ROOT_DIRECTORY, "assets", "v2", "shared_layer", "python"),
+]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def restaurants_metadata_json():
+    districts = ["Old Town", "Harbour"]
+    cuisines = ["Italian", "Greek", "Thai"]
+    dishes = ["pasta", "pesto", "moussaka", "pad thai", "gelato"]
+
+    return [
+        {
+            "district_name": districts[i % len(districts)],
+            "restaurant_name": f"Restaurant{i:02}",
+            "restaurant_cuisine": cuisines[i % len(cuisines)],
+            "signature_dish": dishes[i % len(dishes)],
+            "dishes": [dishes[(i + j) % len(dishes)] for j in range(3)],
+            "average_price_per_person": 10 + i,
+            "rating_food_stars": 1 + i % 5,
+            "rating_service_stars": 1 + (i * 3) % 5,
+            "capacity_persons": 4 + i % 3,
+        }
+        for i in range(30)
+    ]
@@ -0,0 +1,154 @@
+import os
+import json
+import importlib.util
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from conftest import ROOT_DIRECTORY  # noqa: E402
+
+HANDLER_PATH = os.path.join(
+    ROOT_DIRECTORY, "assets", "v2", "metadata_query_lambda", "handler.py"
+)
+SQL_QUERY = "SELECT restaurant_name FROM restaurants ORDER BY restaurant_name"
+
+
+class _Context:
+    def get_remaining_time_in_millis(self):
+        return 30_000
+
+
+@pytest.fixture(scope="module")
+def handler(restaurants_metadata_json):
+    with pytest.MonkeyPatch.context() as monkeypatch, moto.mock_aws():
+        for name, value in {
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "METADATA_S3_BUCKET": "restaurants",
+            "METADATA_S3_KEY": "restaurants-v2/restaurant-metadata.json",
+            "DYNAMODB_TABLE_NAME": "sql-queries",
+            "METADATA_ENGINE_MODE": "stdlib",
+            # Small pages, so that the 30 restaurants are split in several pages
+            "MAX_RESPONSE_BYTES": "300",
+        }.items():
+            monkeypatch.setenv(name, value)
+
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="restaurants")
+        s3_client.put_object(
+            Bucket="restaurants",
+            Key="restaurants-v2/restaurant-metadata.json",
+            Body=json.dumps(restaurants_metadata_json).encode("utf-8"),
+        )
+        boto3.client("dynamodb").create_table(
+            TableName="sql-queries",
+            KeySchema=[{"AttributeName": "timestamp_utc", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "timestamp_utc", "AttributeType": "S"}
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+        # Every lambda has a handler module, load this one under its own name
+        spec = importlib.util.spec_from_file_location(
+            "metadata_query_handler", HANDLER_PATH
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        yield module
+
+
+def _call(handler, function, session_attributes, sql_query=None):
+    event = {
+        "actionGroup": "FindRestaurants",
+        "function": function,
+        "parameters": (
+            [{"name": "sql_query", "type": "string", "value": sql_query}]
+            if sql_query is not None
+            else []
+        ),
+        "sessionAttributes": session_attributes,
+        "promptSessionAttributes": {},
+    }
+    response = handler.main(event, _Context())
+
+    return (
+        response["response"]["functionResponse"]["responseBody"]["TEXT"]["body"],
+        response["sessionAttributes"],
+    )
+
+
+def _page_records(body):
+    return json.loads(body.split("\n")[0])
+
+
+def test_pages_cover_all_records_once(handler):
+    body, session_attributes = _call(handler, "find_restaurants", {}, SQL_QUERY)
+    assert "Call the function next_page" in body
+    records = _page_records(body)
+
+    while handler.CURSOR_SESSION_ATTRIBUTE in session_attributes:
+        cursor = json.loads(session_attributes[handler.CURSOR_SESSION_ATTRIBUTE])
+        assert cursor["offset"] == len(records)
+
+        body, session_attributes = _call(handler, "next_page", session_attributes)
+        records.extend(_page_records(body))
+
+    assert "These are the last results" in body
+    assert [r["restaurant_name"] for r in records] == [
+        f"Restaurant{i:02}" for i in range(30)
+    ]
+
+
+def test_single_page_has_no_cursor(handler):
+    body, session_attributes = _call(
+        handler,
+        "find_restaurants",
+        {handler.CURSOR_SESSION_ATTRIBUTE: "stale"},
+        "SELECT restaurant_name FROM restaurants WHERE restaurant_name = 'Restaurant01'",
+    )
+
+    assert json.loads(body) == [{"restaurant_name": "Restaurant01"}]
+    assert handler.CURSOR_SESSION_ATTRIBUTE not in session_attributes
+
+
+def test_next_page_without_cursor(handler):
+    body, session_attributes = _call(handler, "next_page", {})
+
+    assert body.startswith("There are no more results")
+    assert session_attributes == {}
+
+
+def test_next_page_after_metadata_change(handler):
+    _, session_attributes = _call(handler, "find_restaurants", {}, SQL_QUERY)
+    cursor = json.loads(session_attributes[handler.CURSOR_SESSION_ATTRIBUTE])
+    cursor["metadata_version"] = "previous-version"
+    session_attributes[handler.CURSOR_SESSION_ATTRIBUTE] = json.dumps(cursor)
+
+    body, session_attributes = _call(handler, "next_page", session_attributes)
+
+    assert body.startswith("The restaurant data has changed")
+    assert handler.CURSOR_SESSION_ATTRIBUTE not in session_attributes
+
+
+def test_page_has_at_least_one_record(handler):
+    records = [{"description": "x" * 1000}, {"description": "y"}]
+    records_sizes = [len(json.dumps(r)) for r in records]
+
+    page, end = handler._get_page(records, records_sizes, 0)
+
+    assert page == records[:1]
+    assert end == 1
+
+
+def test_audit_records_written_before_returning(handler):
+    dynamodb_client = boto3.client("dynamodb")
+    count_before = dynamodb_client.scan(TableName="sql-queries")["Count"]
+
+    _call(handler, "find_restaurants", {}, SQL_QUERY)
+
+    assert dynamodb_client.scan(TableName="sql-queries")["Count"] == count_before + 1
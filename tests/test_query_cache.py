@@ -0,0 +1,95 @@
+import pytest
+
+from query_cache import QueryResultCache, normalize_sql
+
+
+@pytest.mark.parametrize(
+    "sql_query, equivalent_sql_query",
+    [
+        (
+            "SELECT restaurant_name FROM restaurants WHERE district_name = 'Old Town'",
+            "select restaurant_name\nfrom  restaurants\n"
+            "where district_name='Old Town';",
+        ),
+        (
+            "SELECT restaurant_name FROM restaurants r -- the cheapest\nLIMIT 5",
+            "SELECT restaurant_name FROM restaurants AS r /* the cheapest */ LIMIT 5;;",
+        ),
+        (
+            "SELECT restaurant_name FROM restaurants WHERE LOWER(dishes) LIKE '%pesto%'",
+            "SELECT restaurant_name FROM restaurants WHERE lower( dishes ) like '%pesto%'",
+        ),
+        (
+            "SELECT restaurant_name, RANK() OVER w FROM restaurants "
+            "WINDOW w AS (ORDER BY average_price_per_person)",
+            "SELECT restaurant_name, RANK() OVER w FROM restaurants "
+            "window w as (order by average_price_per_person)",
+        ),
+    ],
+)
+def test_normalize_sql_ignores_formatting(sql_query, equivalent_sql_query):
+    assert normalize_sql(sql_query) == normalize_sql(equivalent_sql_query)
+
+
+@pytest.mark.parametrize(
+    "sql_query, other_sql_query",
+    [
+        # Same rows, but the result columns are named by the expression text
+        ("SELECT COUNT(*) FROM restaurants", "select count(*) from restaurants"),
+        ("SELECT AVG(x) FROM restaurants", "SELECT avg( x ) FROM restaurants"),
+        (
+            "SELECT * FROM (SELECT COUNT(*) FROM restaurants)",
+            "SELECT * FROM (SELECT count(*) FROM restaurants)",
+        ),
+        # String literals and identifiers are case sensitive
+        (
+            "SELECT * FROM restaurants WHERE district_name = 'Old Town'",
+            "SELECT * FROM restaurants WHERE district_name = 'old town'",
+        ),
+        ("SELECT name FROM restaurants", "SELECT Name FROM restaurants"),
+    ],
+)
+def test_normalize_sql_keeps_differences(sql_query, other_sql_query):
+    assert normalize_sql(sql_query) != normalize_sql(other_sql_query)
+
+
+def test_normalize_sql_keeps_result_columns_as_written():
+    assert (
+        normalize_sql(
+            "SELECT  COUNT(*) AS n ,AVG(x)\nFROM t WHERE a IN (SELECT b FROM u)"
+        )
+        == "select COUNT(*) AS n ,AVG(x) from t where a in ( select b from u )"
+    )
+
+
+def test_normalize_sql_keeps_as_of_cast():
+    assert normalize_sql("SELECT 1 FROM t WHERE CAST(x AS INTEGER) > 1") == (
+        "select 1 from t where cast ( x as INTEGER ) > 1"
+    )
+
+
+def test_cache_hit_for_equivalent_query():
+    cache = QueryResultCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+    cache.put("SELECT a FROM t WHERE b = 1", "v1", ["result"], 10)
+
+    assert cache.get("select a from t where b=1;", "v1") == ["result"]
+    assert cache.get("SELECT A FROM t WHERE b = 1", "v1") is None
+
+
+def test_cache_dropped_when_metadata_version_changes():
+    cache = QueryResultCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+    cache.put("SELECT a FROM t", "v1", ["result"], 10)
+
+    assert cache.get("SELECT a FROM t", "v2") is None
+    assert cache.get("SELECT a FROM t", "v1") is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = QueryResultCache(max_entries=2, max_bytes=1000, ttl_seconds=60)
+    cache.put("SELECT 1 FROM t", "v1", [1], 10)
+    cache.put("SELECT 2 FROM t", "v1", [2], 10)
+    cache.get("SELECT 1 FROM t", "v1")
+    cache.put("SELECT 3 FROM t", "v1", [3], 10)
+
+    assert cache.get("SELECT 1 FROM t", "v1") == [1]
+    assert cache.get("SELECT 2 FROM t", "v1") is None
@@ -0,0 +1,116 @@
+from datetime import date
+
+import pytest
+
+from reservation_slots import (
+    KEY_SEPARATOR,
+    InvalidSlot,
+    ReservationSlot,
+    SlotSettings,
+    normalize_guest_name,
+    parse_reservation_id,
+    parse_slot,
+    reservation_id,
+)
+
+TODAY = date(2025, 3, 10)
+SETTINGS = SlotSettings(
+    slot_minutes=90, opening_time="12:00", closing_time="22:30", max_days_ahead=30
+)
+
+
+def test_slot_starts():
+    assert SETTINGS.slot_starts() == [
+        "12:00",
+        "13:30",
+        "15:00",
+        "16:30",
+        "18:00",
+        "19:30",
+        "21:00",
+    ]
+
+
+@pytest.mark.parametrize(
+    "reservation_time, slot_start",
+    [("12:00", "12:00"), ("13:29", "12:00"), ("13:30", "13:30"), ("22:29", "21:00")],
+)
+def test_parse_slot_returns_slot_of_the_time(reservation_time, slot_start):
+    assert parse_slot("2025-03-12", reservation_time, SETTINGS, today=TODAY) == (
+        ReservationSlot("2025-03-12", slot_start)
+    )
+
+
+def test_parse_slot_strips_whitespace():
+    assert parse_slot(" 2025-03-10 ", " 19:45 ", SETTINGS, today=TODAY) == (
+        ReservationSlot("2025-03-10", "19:30")
+    )
+
+
+@pytest.mark.parametrize(
+    "reservation_date, reservation_time, message",
+    [
+        ("10/03/2025", "19:00", "use the format YYYY-MM-DD"),
+        ("2025-03-10", "7pm", "use the format HH:MM"),
+        ("2025-03-09", "19:00", "from today"),
+        ("2025-04-10", "19:00", "to 2025-04-09"),
+        ("2025-03-10", "11:59", "slots start at 12:00"),
+        ("2025-03-10", "22:30", "slots start at 12:00"),
+    ],
+)
+def test_parse_slot_rejects_invalid_slots(reservation_date, reservation_time, message):
+    with pytest.raises(InvalidSlot, match=message):
+        parse_slot(reservation_date, reservation_time, SETTINGS, today=TODAY)
+
+
+def test_slot_keys():
+    slot = ReservationSlot("2025-03-10", "19:30")
+
+    assert slot.key == f"2025-03-10{KEY_SEPARATOR}19:30"
+    assert slot.key_prefix == f"2025-03-10{KEY_SEPARATOR}19:30{KEY_SEPARATOR}"
+
+
+def test_reservation_id_round_trip():
+    slot = ReservationSlot("2025-03-10", "19:30")
+
+    first_id = reservation_id(slot)
+    second_id = reservation_id(slot)
+
+    assert first_id.startswith(slot.key_prefix)
+    assert first_id != second_id
+    assert parse_reservation_id(first_id) == slot
+
+
+def test_reservation_ids_sort_by_slot():
+    slots = [
+        ReservationSlot("2025-03-10", "19:30"),
+        ReservationSlot("2025-03-11", "12:00"),
+        ReservationSlot("2025-03-10", "21:00"),
+    ]
+
+    ids = [reservation_id(slot) for slot in slots]
+
+    assert [parse_reservation_id(i) for i in sorted(ids)] == sorted(
+        slots, key=lambda slot: slot.key
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "",
+        "   ",
+        "2025-03-10",
+        f"2025-03-10{KEY_SEPARATOR}19:30",
+        f"2025-03-10{KEY_SEPARATOR}19:30{KEY_SEPARATOR}",
+        f"2025-13-10{KEY_SEPARATOR}19:30{KEY_SEPARATOR}abc",
+        f"2025-03-10{KEY_SEPARATOR}dinner{KEY_SEPARATOR}abc",
+    ],
+)
+def test_parse_reservation_id_rejects_invalid_ids(value):
+    with pytest.raises(ValueError):
+        parse_reservation_id(value)
+
+
+def test_normalize_guest_name():
+    assert normalize_guest_name("  Anna   MARIA Smith ") == "anna maria smith"
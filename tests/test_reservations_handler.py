@@ -0,0 +1,406 @@
+import os
+import json
+import importlib.util
+from datetime import date, timedelta
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from conftest import ROOT_DIRECTORY  # noqa: E402
+
+HANDLER_PATH = os.path.join(
+    ROOT_DIRECTORY, "assets", "v2", "reservations_lambda", "handler.py"
+)
+RESERVATION_DATE = (date.today() + timedelta(days=3)).isoformat()
+# Slots of 60 minutes from 12:00, a reservation at 19:30 is in the 19:00 slot
+SLOT_KEY = f"{RESERVATION_DATE}#19:00"
+TABLE_KEYS = {
+    "reservations": ["restaurant_name", "reservation_id"],
+    "booked-capacity": ["restaurant_name", "slot"],
+    "idempotency": ["idempotency_key"],
+}
+
+
+class _Context:
+    def __init__(self, remaining_time_in_millis=30_000):
+        self.remaining_time_in_millis = remaining_time_in_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_time_in_millis
+
+
+def _create_table(dynamodb_client, table_name, **kwargs):
+    keys = TABLE_KEYS[table_name]
+    key_names = set(keys)
+    for index in kwargs.get("GlobalSecondaryIndexes", []):
+        key_names.update(key["AttributeName"] for key in index["KeySchema"])
+
+    dynamodb_client.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": key, "KeyType": key_type}
+            for key, key_type in zip(keys, ["HASH", "RANGE"])
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": key, "AttributeType": "S"} for key in sorted(key_names)
+        ],
+        BillingMode="PAY_PER_REQUEST",
+        **kwargs,
+    )
+
+
+@pytest.fixture(scope="module")
+def handler(restaurants_metadata_json):
+    with pytest.MonkeyPatch.context() as monkeypatch, moto.mock_aws():
+        for name, value in {
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "METADATA_S3_BUCKET": "restaurants",
+            "METADATA_S3_KEY": "restaurants-v2/restaurant-metadata.json",
+            "DYNAMODB_TABLE_NAME": "reservations",
+            "GUEST_INDEX_NAME": "guest-index",
+            "BOOKED_CAPACITY_DYNAMODB_TABLE_NAME": "booked-capacity",
+            "IDEMPOTENCY_DYNAMODB_TABLE_NAME": "idempotency",
+        }.items():
+            monkeypatch.setenv(name, value)
+
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="restaurants")
+        s3_client.put_object(
+            Bucket="restaurants",
+            Key="restaurants-v2/restaurant-metadata.json",
+            Body=json.dumps(restaurants_metadata_json).encode("utf-8"),
+        )
+
+        dynamodb_client = boto3.client("dynamodb")
+        _create_table(
+            dynamodb_client,
+            "reservations",
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "guest-index",
+                    "KeySchema": [
+                        {"AttributeName": "guest_key", "KeyType": "HASH"},
+                        {"AttributeName": "reservation_id", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
+        )
+        _create_table(dynamodb_client, "booked-capacity")
+        _create_table(dynamodb_client, "idempotency")
+
+        # Every lambda has a handler module, load this one under its own name
+        spec = importlib.util.spec_from_file_location(
+            "reservations_handler", HANDLER_PATH
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        yield module
+
+
+@pytest.fixture(autouse=True)
+def empty_tables(handler):
+    yield
+
+    for table_name, keys in TABLE_KEYS.items():
+        for item in _scan(handler, table_name):
+            handler.dynamodb_client.delete_item(
+                TableName=table_name, Key={key: item[key] for key in keys}
+            )
+
+
+def _scan(handler, table_name):
+    return handler.dynamodb_client.scan(TableName=table_name, ConsistentRead=True)[
+        "Items"
+    ]
+
+
+def _booked_persons(handler, restaurant_name):
+    return {
+        item["slot"]["S"]: int(item["booked_persons"]["N"])
+        for item in _scan(handler, "booked-capacity")
+        if item["restaurant_name"]["S"] == restaurant_name
+    }
+
+
+def _call(handler, function, parameters, session_id="session-1", context=None):
+    event = {
+        "actionGroup": "Reservations",
+        "function": function,
+        "parameters": [
+            {"name": name, "type": "string", "value": str(value)}
+            for name, value in parameters.items()
+        ],
+        "sessionId": session_id,
+        "sessionAttributes": {},
+        "promptSessionAttributes": {},
+    }
+    response = handler.main(event, context or _Context())
+
+    return response["response"]["functionResponse"]["responseBody"]["TEXT"]["body"]
+
+
+def _reservation(restaurant_name, main_guest_name, number_of_persons):
+    return {
+        "restaurant_name": restaurant_name,
+        "main_guest_name": main_guest_name,
+        "number_of_persons": number_of_persons,
+        "reservation_date": RESERVATION_DATE,
+        "reservation_time": "19:30",
+    }
+
+
+def test_reservation_is_written_with_capacity_and_request(handler):
+    body = _call(handler, "make_reservation", _reservation("Restaurant01", "Ann", 3))
+
+    assert body.startswith("Reservation was made successfully at Restaurant01")
+    assert body.endswith("Remaining capacity is 2 persons.")
+
+    (reservation,) = _scan(handler, "reservations")
+    assert reservation["reservation_id"]["S"].startswith(SLOT_KEY)
+    assert reservation["guest_key"]["S"] == "ann"
+    assert reservation["number_of_persons"]["N"] == "3"
+    assert _booked_persons(handler, "Restaurant01") == {SLOT_KEY: 3}
+
+    # The request is completed in the same transaction, with the answer
+    (request,) = _scan(handler, "idempotency")
+    assert request["idempotency_key"] == reservation["idempotency_key"]
+    assert reservation["reservation_id"]["S"] in request["response_body"]["S"]
+
+
+def test_retried_reservation_is_made_once(handler):
+    first_body = _call(
+        handler, "make_reservation", _reservation("Restaurant01", "Ann", 3)
+    )
+    # The same request, spelled differently in the same slot
+    retried = dict(_reservation("restaurant 01", "Ann", "3"), reservation_time="19:05")
+    second_body = _call(handler, "make_reservation", retried)
+
+    assert second_body == first_body
+    assert len(_scan(handler, "reservations")) == 1
+    assert _booked_persons(handler, "Restaurant01") == {SLOT_KEY: 3}
+
+
+def test_concurrent_retry_is_detected_by_the_transaction(handler, monkeypatch):
+    first_body = _call(
+        handler, "make_reservation", _reservation("Restaurant01", "Ann", 3)
+    )
+
+    # The retry starts before the first request is completed, only the
+    # condition on the request in the transaction finds the duplicate
+    get_completed_response = handler._get_completed_response
+    calls = []
+
+    def completed_after_the_check(request_key):
+        calls.append(request_key)
+        return get_completed_response(request_key) if len(calls) > 1 else None
+
+    monkeypatch.setattr(handler, "_get_completed_response", completed_after_the_check)
+    second_body = _call(
+        handler, "make_reservation", _reservation("Restaurant01", "Ann", 3)
+    )
+
+    assert second_body == first_body
+    assert len(_scan(handler, "reservations")) == 1
+    assert _booked_persons(handler, "Restaurant01") == {SLOT_KEY: 3}
+
+
+def test_same_reservation_in_another_session_is_made_again(handler):
+    _call(handler, "make_reservation", _reservation("Restaurant02", "Ann", 2))
+    _call(
+        handler,
+        "make_reservation",
+        _reservation("Restaurant02", "Ann", 2),
+        session_id="session-2",
+    )
+
+    assert len(_scan(handler, "reservations")) == 2
+    assert _booked_persons(handler, "Restaurant02") == {SLOT_KEY: 4}
+
+
+def test_reservation_over_capacity_is_rejected(handler):
+    # Restaurant00 takes 4 persons per slot
+    _call(handler, "make_reservation", _reservation("Restaurant00", "Ann", 3))
+    body = _call(handler, "make_reservation", _reservation("Restaurant00", "Bob", 2))
+
+    assert body == (
+        "The reservation was not made, Restaurant00 does not have enough capacity "
+        f"on {RESERVATION_DATE} at 19:00. Remaining capacity is 1 persons."
+    )
+    assert len(_scan(handler, "reservations")) == 1
+    assert _booked_persons(handler, "Restaurant00") == {SLOT_KEY: 3}
+
+
+def test_reservation_larger_than_the_restaurant_is_rejected(handler):
+    body = _call(handler, "make_reservation", _reservation("Restaurant00", "Ann", 5))
+
+    assert body.endswith("Remaining capacity is 4 persons.")
+    assert _scan(handler, "reservations") == []
+    assert _scan(handler, "idempotency") == []
+
+
+def _batch(*reservations):
+    return {"reservations": json.dumps(list(reservations))}
+
+
+def _outcomes(body):
+    # One line per reservation between the header and the summary
+    return [line.split("|")[-1] for line in body.split("\n")[1:-1]]
+
+
+def test_batch_reports_the_outcome_of_each_reservation(handler):
+    body = _call(
+        handler,
+        "make_reservations_batch",
+        _batch(
+            _reservation("Restaurant00", "Ann", 3),
+            # Restaurant00 has only 1 person left after the first reservation
+            _reservation("Restaurant00", "Bob", 2),
+            _reservation("Restaurant00", "Cy", 0),
+            _reservation("Restaurant01", "Dan", 5),
+        ),
+    )
+
+    outcomes = _outcomes(body)
+    assert outcomes[0].startswith(f"made: reservation id {SLOT_KEY}")
+    assert (
+        outcomes[1] == "not made: not enough capacity, remaining capacity is 1 persons"
+    )
+    assert outcomes[2].startswith("not made:")
+    assert outcomes[3].startswith(f"made: reservation id {SLOT_KEY}")
+    assert body.endswith("2 of 4 reservations were made.")
+
+    assert len(_scan(handler, "reservations")) == 2
+    assert _booked_persons(handler, "Restaurant00") == {SLOT_KEY: 3}
+    assert _booked_persons(handler, "Restaurant01") == {SLOT_KEY: 5}
+
+    # The claim of the batch is replaced by its answer
+    (request,) = _scan(handler, "idempotency")
+    assert request["response_body"]["S"] == body
+
+
+def test_retried_batch_is_answered_without_booking_again(handler):
+    batch = _batch(
+        _reservation("Restaurant00", "Ann", 3), _reservation("Restaurant01", "Bob", 2)
+    )
+    first_body = _call(handler, "make_reservations_batch", batch)
+    second_body = _call(handler, "make_reservations_batch", batch)
+
+    assert second_body == first_body
+    assert len(_scan(handler, "reservations")) == 2
+    assert _booked_persons(handler, "Restaurant00") == {SLOT_KEY: 3}
+    assert _booked_persons(handler, "Restaurant01") == {SLOT_KEY: 2}
+
+
+def test_batch_retried_while_it_is_made_is_not_booked_twice(handler, monkeypatch):
+    batch = _batch(_reservation("Restaurant02", "Ann", 2))
+    book_capacity = handler._book_capacity
+    retried_bodies = []
+
+    def book_capacity_with_retry(reservation):
+        retried_bodies.append(_call(handler, "make_reservations_batch", batch))
+        book_capacity(reservation)
+
+    monkeypatch.setattr(handler, "_book_capacity", book_capacity_with_retry)
+    body = _call(handler, "make_reservations_batch", batch)
+
+    assert retried_bodies == [
+        "The same reservations are still being made, check them with "
+        "list_reservations before trying again."
+    ]
+    assert body.endswith("1 of 1 reservations were made.")
+    assert _booked_persons(handler, "Restaurant02") == {SLOT_KEY: 2}
+
+
+def _assert_batch_rolled_back(handler):
+    # The persons are given back, the reservations and the claim are removed
+    assert _scan(handler, "reservations") == []
+    assert _scan(handler, "idempotency") == []
+    for restaurant_name in ["Restaurant00", "Restaurant01"]:
+        assert all(
+            persons == 0
+            for persons in _booked_persons(handler, restaurant_name).values()
+        )
+
+
+def test_batch_failing_while_booking_is_rolled_back(handler, monkeypatch):
+    batch = _batch(
+        _reservation("Restaurant00", "Ann", 3), _reservation("Restaurant01", "Bob", 2)
+    )
+    book_capacity = handler._book_capacity
+
+    def book_capacity_failing_second(reservation):
+        if reservation["restaurant_name"] == "Restaurant01":
+            raise RuntimeError("throttled")
+        book_capacity(reservation)
+
+    monkeypatch.setattr(handler, "_book_capacity", book_capacity_failing_second)
+    with pytest.raises(RuntimeError, match="throttled"):
+        _call(handler, "make_reservations_batch", batch)
+
+    _assert_batch_rolled_back(handler)
+
+    # Once the claim is released the batch can be made again
+    monkeypatch.setattr(handler, "_book_capacity", book_capacity)
+    body = _call(handler, "make_reservations_batch", batch)
+
+    assert body.endswith("2 of 2 reservations were made.")
+    assert _booked_persons(handler, "Restaurant00") == {SLOT_KEY: 3}
+
+
+def test_batch_failing_after_a_partial_write_is_rolled_back(handler, monkeypatch):
+    batch_write_item = handler.dynamodb_client.batch_write_item
+
+    def batch_write_first_item(RequestItems):
+        batch_write_item(
+            RequestItems={
+                table_name: requests[:1]
+                for table_name, requests in RequestItems.items()
+            }
+        )
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(
+        handler.dynamodb_client, "batch_write_item", batch_write_first_item
+    )
+    with pytest.raises(RuntimeError, match="connection reset"):
+        _call(
+            handler,
+            "make_reservations_batch",
+            _batch(
+                _reservation("Restaurant00", "Ann", 3),
+                _reservation("Restaurant01", "Bob", 2),
+            ),
+        )
+
+    _assert_batch_rolled_back(handler)
+
+
+def test_batch_is_rolled_back_before_the_lambda_times_out(handler, monkeypatch):
+    context = _Context()
+    book_capacity = handler._book_capacity
+
+    def book_capacity_slowly(reservation):
+        book_capacity(reservation)
+        context.remaining_time_in_millis = handler.DEADLINE_MARGIN_MILLIS - 1
+
+    monkeypatch.setattr(handler, "_book_capacity", book_capacity_slowly)
+    body = _call(
+        handler,
+        "make_reservations_batch",
+        _batch(
+            _reservation("Restaurant00", "Ann", 3),
+            _reservation("Restaurant01", "Bob", 2),
+        ),
+        context=context,
+    )
+
+    assert body == (
+        "The reservations were not made because they took too long, make them again."
+    )
+    _assert_batch_rolled_back(handler)
@@ -0,0 +1,130 @@
+import pytest
+
+from restaurants_db import (
+    ENGINE_MODE_PANDAS,
+    ENGINE_MODE_STDLIB,
+    RestaurantsDatabase,
+    QueryLimits,
+    QueryError,
+    QueryRejected,
+)
+
+RUNAWAY_SQL_QUERY = (
+    "WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers) "
+    "SELECT COUNT(*) FROM numbers"
+)
+
+SQL_QUERY = (
+    "SELECT restaurant_name, average_price_per_person FROM restaurants "
+    "WHERE district_name = 'Old Town' AND restaurant_cuisine = 'Italian' "
+    "ORDER BY average_price_per_person"
+)
+
+
+def test_stdlib_mode_returns_records(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(
+        restaurants_metadata_json, mode=ENGINE_MODE_STDLIB
+    )
+
+    assert database.query(SQL_QUERY) == [
+        {"restaurant_name": "Restaurant00", "average_price_per_person": 10},
+        {"restaurant_name": "Restaurant06", "average_price_per_person": 16},
+        {"restaurant_name": "Restaurant12", "average_price_per_person": 22},
+        {"restaurant_name": "Restaurant18", "average_price_per_person": 28},
+        {"restaurant_name": "Restaurant24", "average_price_per_person": 34},
+    ]
+
+
+def test_pandas_and_stdlib_modes_return_the_same_records(restaurants_metadata_json):
+    pytest.importorskip("pandas")
+
+    pandas_database = RestaurantsDatabase.from_metadata_json(
+        restaurants_metadata_json, mode=ENGINE_MODE_PANDAS
+    )
+    stdlib_database = RestaurantsDatabase.from_metadata_json(
+        restaurants_metadata_json, mode=ENGINE_MODE_STDLIB
+    )
+
+    for sql_query in [
+        SQL_QUERY,
+        "SELECT district_name, AVG(rating_food_stars) AS avg_rating "
+        "FROM restaurants GROUP BY district_name ORDER BY district_name",
+        "SELECT restaurant_name FROM restaurants WHERE signature_dish = 'nothing'",
+    ]:
+        assert pandas_database.query(sql_query) == stdlib_database.query(sql_query)
+
+
+def test_invalid_query_raises_query_error(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(restaurants_metadata_json)
+
+    with pytest.raises(QueryError):
+        database.query("SELECT missing_column FROM restaurants")
+
+
+def test_check_plan_rejects_joins_without_condition(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(
+        restaurants_metadata_json, limits=QueryLimits(max_estimated_rows=10_000)
+    )
+
+    with pytest.raises(QueryRejected, match="combines too many rows"):
+        database.query(
+            "SELECT a.restaurant_name FROM restaurants a, restaurants b, restaurants c"
+        )
+
+    # The same tables joined on an indexed column are searched, not scanned
+    assert database.query(
+        "SELECT a.restaurant_name FROM restaurants a "
+        "JOIN restaurants b ON b.restaurant_name = a.restaurant_name "
+        "JOIN restaurants c ON c.restaurant_name = b.restaurant_name "
+        "WHERE a.restaurant_name = 'Restaurant01'"
+    ) == [{"restaurant_name": "Restaurant01"}]
+
+
+def test_query_rejected_after_max_instructions(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(
+        restaurants_metadata_json, limits=QueryLimits(max_instructions=1_000_000)
+    )
+
+    with pytest.raises(QueryRejected, match="too many steps"):
+        database.query(RUNAWAY_SQL_QUERY)
+
+    # The limits are reset for the next query
+    assert database.query("SELECT COUNT(*) AS n FROM restaurants") == [{"n": 30}]
+
+
+def test_query_rejected_after_max_seconds(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(restaurants_metadata_json)
+
+    with pytest.raises(QueryRejected, match="runs for more than 0.1 seconds"):
+        database.query(RUNAWAY_SQL_QUERY, max_seconds=0.1)
+
+
+def test_query_rejected_when_out_of_memory(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(
+        restaurants_metadata_json, limits=QueryLimits(max_heap_bytes=16 * 1024**2)
+    )
+
+    with pytest.raises(QueryRejected, match="too much memory"):
+        database.query(
+            "WITH RECURSIVE numbers(n) AS "
+            "(SELECT 1 UNION ALL SELECT n + 1 FROM numbers WHERE n < 2000000) "
+            "SELECT n, randomblob(100) AS b FROM numbers ORDER BY b"
+        )
+
+
+def test_query_rejected_above_max_rows(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(
+        restaurants_metadata_json, limits=QueryLimits(max_rows=10)
+    )
+
+    with pytest.raises(QueryRejected, match="more than 10 rows"):
+        database.query("SELECT restaurant_name FROM restaurants")
+
+
+def test_query_cannot_modify_the_data(restaurants_metadata_json):
+    database = RestaurantsDatabase.from_metadata_json(restaurants_metadata_json)
+
+    with pytest.raises(QueryError):
+        database.query("DELETE FROM restaurants")
+
+    assert database.query("SELECT COUNT(*) AS n FROM restaurants") == [{"n": 30}]
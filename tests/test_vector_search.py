@@ -0,0 +1,123 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from vector_search.brute_force import BruteForceIndex  # noqa: E402
+from vector_search.hnsw import HnswIndex  # noqa: E402
+from vector_search.retriever import (  # noqa: E402
+    LocalRetriever,
+    Retriever,
+    BedrockKnowledgeBaseRetriever,
+)
+
+DIMENSION = 32
+K = 10
+
+
+def _random_vectors(count, seed):
+    vectors = np.random.default_rng(seed).standard_normal((count, DIMENSION))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _exact_neighbors(vectors, query, k):
+    return set(np.argsort(((vectors - query) ** 2).sum(axis=1))[:k].tolist())
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return _random_vectors(1000, seed=1)
+
+
+@pytest.fixture(scope="module")
+def queries():
+    return _random_vectors(50, seed=2)
+
+
+def test_brute_force_is_exact(vectors, queries):
+    index = BruteForceIndex(DIMENSION, "l2")
+    index.add(vectors)
+
+    for query in queries:
+        ids, query_distances = index.search(query, K)
+
+        assert set(ids.tolist()) == _exact_neighbors(vectors, query, K)
+        assert list(query_distances) == sorted(query_distances)
+
+
+@pytest.mark.parametrize("compression", ["none", "fp16", "byte"])
+def test_hnsw_recall(vectors, queries, compression):
+    index = HnswIndex(
+        DIMENSION, "l2", m=16, ef_construction=64, compression=compression
+    )
+    index.add(vectors)
+
+    recall = np.mean(
+        [
+            len(set(index.search(query, K, ef_search=64)[0].tolist()) & exact) / K
+            for query in queries
+            for exact in [_exact_neighbors(vectors, query, K)]
+        ]
+    )
+
+    assert recall >= 0.9
+
+
+@pytest.mark.parametrize("m", [0, 1])
+def test_hnsw_rejects_m_below_two(m):
+    with pytest.raises(ValueError, match="m must be at least 2"):
+        HnswIndex(DIMENSION, m=m)
+
+
+def test_retriever_is_abstract():
+    with pytest.raises(TypeError):
+        Retriever()
+
+
+def test_local_retriever_response_shape():
+    retriever = LocalRetriever(
+        {
+            "s3://bucket/pesto.txt": "The pesto is delicious and the pasta is fresh.",
+            "s3://bucket/moussaka.txt": "The moussaka is excellent, the service slow.",
+        }
+    )
+
+    results = retriever.retrieve("delicious pesto", number_of_results=1)[
+        "retrievalResults"
+    ]
+
+    assert len(results) == 1
+    assert results[0]["content"] == {
+        "type": "TEXT",
+        "text": "The pesto is delicious and the pasta is fresh.",
+    }
+    assert results[0]["location"] == {
+        "type": "S3",
+        "s3Location": {"uri": "s3://bucket/pesto.txt"},
+    }
+    assert results[0]["metadata"]["x-amz-bedrock-kb-source-uri"] == (
+        "s3://bucket/pesto.txt"
+    )
+    assert 0 < results[0]["score"] <= 1
+
+
+def test_local_retriever_rejects_unused_index_arguments():
+    with pytest.raises(TypeError):
+        LocalRetriever({}, index_type="brute_force", m=8)
+
+    assert len(LocalRetriever({"s3://bucket/a.txt": "pasta"}, index_type="hnsw", m=8))
+
+
+def test_bedrock_retriever_drops_response_metadata():
+    class _Client:
+        def retrieve(self, **kwargs):
+            self.kwargs = kwargs
+            return {"retrievalResults": [], "ResponseMetadata": {}}
+
+    client = _Client()
+    retriever = BedrockKnowledgeBaseRetriever("kb-id", client=client)
+
+    assert retriever.retrieve("pesto", number_of_results=3) == {"retrievalResults": []}
+    assert client.kwargs["knowledgeBaseId"] == "kb-id"
+    assert client.kwargs["retrievalConfiguration"] == {
+        "vectorSearchConfiguration": {"numberOfResults": 3}
+    }
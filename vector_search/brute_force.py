@@ -0,0 +1,43 @@
+import numpy as np
+
+from vector_search.storage import SPACE_TYPES, VectorStore, distances
+
+
+class BruteForceIndex:
+    """
+    Exact k-NN search comparing the query with every vector, the ground truth
+    for the recall of the approximate indexes.
+    """
+
+    def __init__(self, dimension: int, space_type: str = "l2"):
+        if space_type not in SPACE_TYPES:
+            raise ValueError(f"space_type must be one of {SPACE_TYPES}")
+
+        self.space_type = space_type
+        self._store = VectorStore(dimension)
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def nbytes(self):
+        return self._store.nbytes
+
+    def add(self, vectors):
+        return self._store.add(vectors)
+
+    def search(self, query, k: int):
+        """
+        Returns the ids of the k nearest vectors and their distances, closest first.
+        """
+        query_distances = distances(
+            self.space_type, np.asarray(query, dtype=np.float32), self._store.all()
+        )
+        k = min(k, len(query_distances))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        nearest = np.argpartition(query_distances, k - 1)[:k]
+        nearest = nearest[np.argsort(query_distances[nearest], kind="stable")]
+
+        return nearest, query_distances[nearest]
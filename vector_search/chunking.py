@@ -0,0 +1,35 @@
+import re
+
+TOKEN_PATTERN = re.compile(r"\S+")
+
+# The default fixed size chunking of Bedrock knowledge bases
+DEFAULT_CHUNK_TOKENS = 300
+DEFAULT_OVERLAP_PERCENTAGE = 20
+
+
+def chunk_text(
+    text: str,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_percentage: int = DEFAULT_OVERLAP_PERCENTAGE,
+):
+    """
+    Splits the text in chunks of at most chunk_tokens whitespace separated
+    tokens, consecutive chunks share overlap_percentage of their tokens.
+    """
+    if chunk_tokens <= 0:
+        raise ValueError("chunk_tokens must be positive")
+    if not 0 <= overlap_percentage < 100:
+        raise ValueError("overlap_percentage must be between 0 and 99")
+
+    tokens = TOKEN_PATTERN.findall(text)
+    step = max(chunk_tokens - chunk_tokens * overlap_percentage // 100, 1)
+
+    chunks = []
+    for start in range(0, max(len(tokens), 1), step):
+        chunk = tokens[start : start + chunk_tokens]
+        if chunk:
+            chunks.append(" ".join(chunk))
+        if start + chunk_tokens >= len(tokens):
+            break
+
+    return chunks
@@ -0,0 +1,43 @@
+import re
+import hashlib
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline stand-in for the embedding model. Words and word
+    pairs are hashed into signed buckets and the vector is L2 normalized,
+    so texts sharing words are close like with a real embedding model.
+    """
+
+    def __init__(self, dimension: int = 256, seed: int = 0):
+        self.dimension = dimension
+        self.seed = seed
+
+    def _features(self, text):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _bucket(self, feature):
+        digest = hashlib.blake2b(
+            feature.encode("utf-8"), digest_size=8, salt=self.seed.to_bytes(8, "big")
+        ).digest()
+        value = int.from_bytes(digest, "big")
+
+        return value % self.dimension, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                bucket, sign = self._bucket(feature)
+                vectors[row, bucket] += sign
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        return vectors / norms
@@ -0,0 +1,212 @@
+import math
+import heapq
+import random
+
+import numpy as np
+
+from vector_search.storage import (
+    SPACE_TYPES,
+    VectorStore,
+    distances,
+    pairwise_distances,
+)
+
+# Size of the neighbor ids in the graph, like the int32 links of faiss
+LINK_BYTES = 4
+
+
+class HnswIndex:
+    """
+    Hierarchical navigable small world graph (Malkov and Yashunin) with the
+    parameters of the HNSW method of the OpenSearch k-NN plugin. Each node has
+    up to m neighbors per layer and 2 * m on the bottom layer, the neighbors
+    are chosen with the diversity heuristic of the paper.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        space_type: str = "l2",
+        m: int = 16,
+        ef_construction: int = 512,
+        ef_search: int = 512,
+        compression: str = "none",
+        seed: int = 0,
+    ):
+        if space_type not in SPACE_TYPES:
+            raise ValueError(f"space_type must be one of {SPACE_TYPES}")
+        # The levels of the nodes are drawn with 1 / log(m)
+        if m < 2:
+            raise ValueError("m must be at least 2")
+
+        self.space_type = space_type
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._store = VectorStore(dimension, compression)
+        self._level_multiplier = 1 / math.log(m)
+        self._random = random.Random(seed)
+
+        # Neighbor ids of each node, one list per layer of the node
+        self._links = []
+        self._entry_point = None
+        self._max_layer = -1
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def nbytes(self):
+        """
+        Memory of the stored vectors and the links of the graph.
+        """
+        links = sum(len(layer) for node in self._links for layer in node)
+        return self._store.nbytes + links * LINK_BYTES
+
+    def _distances(self, query, ids):
+        return distances(self.space_type, query, self._store.get(ids))
+
+    def _max_neighbors(self, layer):
+        return 2 * self.m if layer == 0 else self.m
+
+    def _search_layer(self, query, entry_points, ef, layer):
+        """
+        Best first search of a layer, returns the ef closest (distance, id)
+        pairs that were found, closest first.
+        """
+        visited = set(entry_points)
+        entry_distances = self._distances(query, entry_points)
+
+        candidates = list(zip(entry_distances.tolist(), entry_points))
+        heapq.heapify(candidates)
+        nearest = [(-d, node) for d, node in candidates]
+        heapq.heapify(nearest)
+        while len(nearest) > ef:
+            heapq.heappop(nearest)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -nearest[0][0] and len(nearest) >= ef:
+                break
+
+            neighbors = [n for n in self._links[node][layer] if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+
+            for neighbor_distance, neighbor in zip(
+                self._distances(query, neighbors).tolist(), neighbors
+            ):
+                if len(nearest) < ef or neighbor_distance < -nearest[0][0]:
+                    heapq.heappush(candidates, (neighbor_distance, neighbor))
+                    heapq.heappush(nearest, (-neighbor_distance, neighbor))
+                    if len(nearest) > ef:
+                        heapq.heappop(nearest)
+
+        return sorted((-d, node) for d, node in nearest)
+
+    def _select_neighbors(self, candidates, max_neighbors):
+        """
+        Keeps a candidate only if it is closer to the base node than to the
+        neighbors already selected, so that the neighbors point in different
+        directions. The candidates are (distance, id) pairs, closest first.
+        """
+        if len(candidates) <= 1:
+            return [node for _, node in candidates]
+
+        candidate_ids = [node for _, node in candidates]
+        between = pairwise_distances(
+            self.space_type, self._store.get(candidate_ids)
+        ).tolist()
+
+        selected = []
+        for i, (distance, node) in enumerate(candidates):
+            if len(selected) >= max_neighbors:
+                break
+
+            if any(between[i][j] < distance for j in selected):
+                continue
+            selected.append(i)
+
+        return [candidate_ids[i] for i in selected]
+
+    def _connect(self, node, neighbors, layer):
+        self._links[node][layer] = neighbors
+
+        max_neighbors = self._max_neighbors(layer)
+        for neighbor in neighbors:
+            neighbor_links = self._links[neighbor][layer]
+            neighbor_links.append(node)
+
+            if len(neighbor_links) > max_neighbors:
+                neighbor_vector = self._store.get(neighbor)
+                candidates = sorted(
+                    zip(
+                        self._distances(neighbor_vector, neighbor_links).tolist(),
+                        neighbor_links,
+                    )
+                )
+                self._links[neighbor][layer] = self._select_neighbors(
+                    candidates, max_neighbors
+                )
+
+    def _insert(self, node):
+        node_layer = int(
+            -math.log(1.0 - self._random.random()) * self._level_multiplier
+        )
+        self._links.append([[] for _ in range(node_layer + 1)])
+
+        if self._entry_point is None:
+            self._entry_point = node
+            self._max_layer = node_layer
+            return
+
+        query = self._store.get(node)
+        entry_points = [self._entry_point]
+
+        # Greedy descent through the layers above the node
+        for layer in range(self._max_layer, node_layer, -1):
+            entry_points = [self._search_layer(query, entry_points, 1, layer)[0][1]]
+
+        for layer in range(min(node_layer, self._max_layer), -1, -1):
+            candidates = self._search_layer(
+                query, entry_points, self.ef_construction, layer
+            )
+            self._connect(node, self._select_neighbors(candidates, self.m), layer)
+            entry_points = [candidate for _, candidate in candidates]
+
+        if node_layer > self._max_layer:
+            self._entry_point = node
+            self._max_layer = node_layer
+
+    def add(self, vectors):
+        """
+        Adds the vectors one by one and returns their ids.
+        """
+        ids = self._store.add(vectors)
+        for node in ids.tolist():
+            self._insert(node)
+
+        return ids
+
+    def search(self, query, k: int, ef_search: int = None):
+        """
+        Returns the ids of the approximately k nearest vectors and their
+        distances, closest first. ef_search overrides the one of the index.
+        """
+        if self._entry_point is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32)
+        ef = max(ef_search or self.ef_search, k)
+
+        entry_points = [self._entry_point]
+        for layer in range(self._max_layer, 0, -1):
+            entry_points = [self._search_layer(query, entry_points, 1, layer)[0][1]]
+
+        nearest = self._search_layer(query, entry_points, ef, 0)[:k]
+
+        return (
+            np.array([node for _, node in nearest], dtype=np.int64),
+            np.array([d for d, _ in nearest], dtype=np.float32),
+        )
@@ -0,0 +1,182 @@
+import os
+import glob
+import uuid
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from vector_search.brute_force import BruteForceIndex
+from vector_search.chunking import (
+    DEFAULT_CHUNK_TOKENS,
+    DEFAULT_OVERLAP_PERCENTAGE,
+    chunk_text,
+)
+from vector_search.embedding import HashingEmbedder
+from vector_search.hnsw import HnswIndex
+
+DEFAULT_NUMBER_OF_RESULTS = 5
+LOCAL_DATA_SOURCE_ID = "local"
+INDEX_TYPES = ["brute_force", "hnsw"]
+
+
+class Retriever(ABC):
+    """
+    Retrieves the chunks most similar to a query, the result has the shape
+    of the response of the Retrieve API of Bedrock knowledge bases.
+    """
+
+    @abstractmethod
+    def retrieve(self, query_text: str, number_of_results=DEFAULT_NUMBER_OF_RESULTS):
+        pass
+
+
+def _score(space_type, distance):
+    """
+    The score OpenSearch gives to a distance of the space type,
+    higher is more similar.
+    """
+    if space_type == "l2":
+        return 1 / (1 + distance)
+    if space_type == "cosinesimil":
+        return (2 - distance) / 2
+
+    dot_product = -distance
+    return dot_product + 1 if dot_product >= 0 else 1 / (1 - dot_product)
+
+
+class LocalRetriever(Retriever):
+    """
+    In memory stand-in for the knowledge base, the documents are chunked like
+    the data source, embedded with the offline embedder and searched exactly
+    or with HNSW. Searches do not change the index and can run in parallel.
+
+    Brute force is the faster of the two for the thousand or so chunks of the
+    restaurant descriptions, HNSW only pays off for much larger collections.
+    """
+
+    def __init__(
+        self,
+        documents,
+        index_type: str = "brute_force",
+        embedder=None,
+        space_type: str = "l2",
+        chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+        overlap_percentage: int = DEFAULT_OVERLAP_PERCENTAGE,
+        **index_kwargs,
+    ):
+        """
+        documents maps the source uri of each document to its text,
+        index_kwargs are passed to the HNSW index.
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}")
+        if index_type != "hnsw" and index_kwargs:
+            raise TypeError(
+                f"Unexpected arguments for the {index_type} index: "
+                f"{', '.join(index_kwargs)}"
+            )
+
+        self.embedder = embedder or HashingEmbedder()
+        self.space_type = space_type
+
+        self._chunks = []
+        for source_uri, text in documents.items():
+            for chunk in chunk_text(text, chunk_tokens, overlap_percentage):
+                chunk_id = uuid.uuid5(
+                    uuid.NAMESPACE_URL, f"{source_uri}#{len(self._chunks)}"
+                )
+                self._chunks.append((source_uri, str(chunk_id), chunk))
+
+        if index_type == "hnsw":
+            self._index = HnswIndex(
+                self.embedder.dimension, space_type=space_type, **index_kwargs
+            )
+        else:
+            self._index = BruteForceIndex(self.embedder.dimension, space_type)
+
+        if self._chunks:
+            self._index.add(
+                self.embedder.embed([chunk for _, _, chunk in self._chunks])
+            )
+
+    @classmethod
+    def from_directory(cls, directory, s3_uri_prefix=None, **kwargs):
+        """
+        Reads the .txt documents of the directory. Their source uri is under
+        s3_uri_prefix if given, like for the S3 data source of the stack.
+        """
+        documents = {}
+        for file_path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+            file_name = os.path.basename(file_path)
+            source_uri = (
+                f"{s3_uri_prefix.rstrip('/')}/{file_name}"
+                if s3_uri_prefix
+                else f"file://{os.path.abspath(file_path)}"
+            )
+            with open(file_path) as f:
+                documents[source_uri] = f.read()
+
+        return cls(documents, **kwargs)
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def _retrieval_result(self, chunk_index, distance):
+        source_uri, chunk_id, text = self._chunks[chunk_index]
+
+        if source_uri.startswith("s3://"):
+            location = {"type": "S3", "s3Location": {"uri": source_uri}}
+        else:
+            location = {"type": "CUSTOM", "customDocumentLocation": {"id": source_uri}}
+
+        return {
+            "content": {"type": "TEXT", "text": text},
+            "location": location,
+            "metadata": {
+                "x-amz-bedrock-kb-source-uri": source_uri,
+                "x-amz-bedrock-kb-chunk-id": chunk_id,
+                "x-amz-bedrock-kb-data-source-id": LOCAL_DATA_SOURCE_ID,
+            },
+            "score": float(_score(self.space_type, distance)),
+        }
+
+    def retrieve(self, query_text: str, number_of_results=DEFAULT_NUMBER_OF_RESULTS):
+        query_vector = self.embedder.embed([query_text])[0]
+        ids, distances = self._index.search(query_vector, number_of_results)
+
+        return {
+            "retrievalResults": [
+                self._retrieval_result(chunk_index, distance)
+                for chunk_index, distance in zip(
+                    ids.tolist(), np.asarray(distances).tolist()
+                )
+            ]
+        }
+
+
+class BedrockKnowledgeBaseRetriever(Retriever):
+    """
+    Retrieves from the knowledge base of the deployed stack.
+    """
+
+    def __init__(self, knowledge_base_id: str, client=None):
+        self.knowledge_base_id = knowledge_base_id
+
+        if client is None:
+            import boto3
+
+            client = boto3.client("bedrock-agent-runtime")
+        self.client = client
+
+    def retrieve(self, query_text: str, number_of_results=DEFAULT_NUMBER_OF_RESULTS):
+        response = self.client.retrieve(
+            knowledgeBaseId=self.knowledge_base_id,
+            retrievalQuery={"text": query_text},
+            retrievalConfiguration={
+                "vectorSearchConfiguration": {"numberOfResults": number_of_results}
+            },
+        )
+
+        return {
+            key: value for key, value in response.items() if key != "ResponseMetadata"
+        }
@@ -0,0 +1,118 @@
+import numpy as np
+
+SPACE_TYPES = ["l2", "cosinesimil", "innerproduct"]
+COMPRESSIONS = ["none", "fp16", "byte"]
+
+# Lucene scalar quantization keeps 7 bits per dimension
+BYTE_LEVELS = 127
+
+
+def distances(space_type, query, vectors):
+    """
+    Distances from the query to each of the vectors, smaller is closer
+    for every space type like the scores of OpenSearch are larger.
+    """
+    if space_type == "l2":
+        differences = vectors - query
+        return np.einsum("ij,ij->i", differences, differences)
+
+    dot_products = vectors @ query
+    if space_type == "innerproduct":
+        return -dot_products
+
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+    norms[norms == 0] = 1.0
+    return 1.0 - dot_products / norms
+
+
+def pairwise_distances(space_type, vectors):
+    """
+    Distances between each pair of the vectors, as a square matrix.
+    """
+    dot_products = vectors @ vectors.T
+    if space_type == "innerproduct":
+        return -dot_products
+
+    squared_norms = np.diag(dot_products)
+    if space_type == "l2":
+        return squared_norms[:, None] + squared_norms[None, :] - 2 * dot_products
+
+    norms = np.sqrt(squared_norms)
+    norms[norms == 0] = 1.0
+    return 1.0 - dot_products / np.outer(norms, norms)
+
+
+class VectorStore:
+    """
+    Growable array of the vectors of an index, optionally compressed
+    like the scalar quantization encoders of faiss (fp16) and lucene (byte).
+    The byte ranges are trained on the first vectors added.
+    """
+
+    def __init__(self, dimension: int, compression: str = "none"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {COMPRESSIONS}")
+
+        self.dimension = dimension
+        self.compression = compression
+        self._size = 0
+        self._minimum = None
+        self._scale = None
+
+        dtype = {"none": np.float32, "fp16": np.float16, "byte": np.uint8}
+        self._codes = np.zeros((0, dimension), dtype=dtype[compression])
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        # Only the stored part, the spare capacity of the array is not counted
+        return self._size * self._codes.itemsize * self.dimension
+
+    def _encode(self, vectors):
+        if self.compression == "none":
+            return vectors.astype(np.float32)
+        if self.compression == "fp16":
+            return vectors.astype(np.float16)
+
+        if self._minimum is None:
+            self._minimum = vectors.min(axis=0)
+            maximum = vectors.max(axis=0)
+            self._scale = np.where(
+                maximum > self._minimum, (maximum - self._minimum) / BYTE_LEVELS, 1.0
+            ).astype(np.float32)
+
+        codes = np.rint((vectors - self._minimum) / self._scale)
+        return np.clip(codes, 0, BYTE_LEVELS).astype(np.uint8)
+
+    def _decode(self, codes):
+        if self.compression == "byte":
+            return codes.astype(np.float32) * self._scale + self._minimum
+
+        return codes.astype(np.float32)
+
+    def add(self, vectors):
+        """
+        Adds the vectors and returns their ids.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        codes = self._encode(vectors)
+
+        if self._size + len(codes) > len(self._codes):
+            capacity = max(self._size + len(codes), 2 * len(self._codes))
+            grown = np.zeros((capacity, self.dimension), dtype=self._codes.dtype)
+            grown[: self._size] = self._codes[: self._size]
+            self._codes = grown
+
+        self._codes[self._size : self._size + len(codes)] = codes
+        ids = np.arange(self._size, self._size + len(codes))
+        self._size += len(codes)
+
+        return ids
+
+    def get(self, ids):
+        return self._decode(self._codes[ids])
+
+    def all(self):
+        return self._decode(self._codes[: self._size])